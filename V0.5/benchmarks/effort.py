@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# Checks the effort governor against simulated marker poses (governor.py, filters.py).
+# Run from V0.5/:
+#   python benchmarks/effort.py
+#
+# A still marker with measurement noise should let the governor step down to the least
+# effort and stay there; a moving one should keep it at (or bring it back to) full effort.
+# Exits non-zero if either doesn't happen.
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # for V0.5/ modules
+import filters
+import governor
+import overlay
+
+# === CONFIGURATION ===
+DETECT_RATE = 15.0                 # detections per second
+DURATION = 100.0                   # seconds per scenario
+START = np.array([0.0, 0.0, 0.5])  # marker position in meters
+NOISE = [(0.002, 0.002, 0.01), (0.005, 0.005, 0.005), (0.001, 0.001, 0.003)] # pose noise sigma per axis in m
+SPEEDS = [0.05, 0.2]               # marker speeds in m/s for the moving scenarios
+MOVE_AFTER = 10.0                  # the marker that starts moving does so after this many seconds
+MAX_FLAGGED = 0.01                 # most of a still marker's detections that may count as motion
+# ======================
+
+
+def simulate(noise, speed=0.0, move_after=0.0, seed=0):
+    """
+    Feeds one marker's noisy poses through a PoseFilter and a Governor set up like overlay.py.
+
+    Returns:
+        (float, governor.Governor, float): Fraction of detections that counted as motion,
+        the governor, and the first time after move_after it was back at full effort
+        (None if it never was).
+    """
+    rng = np.random.default_rng(seed)
+    pose_filter = filters.PoseFilter(overlay.FILTER_PROCESS_NOISE, overlay.FILTER_MEASUREMENT_NOISE, max_age=1.0)
+    levels = [governor.EffortLevel(*level) for level in overlay.EFFORT_LEVELS]
+    effort = governor.Governor(levels, overlay.LATENCY_BUDGET, overlay.STATIC_HOLD)
+
+    flagged = 0
+    recovered = None
+    count = int(DURATION * DETECT_RATE)
+    for i in range(1, count + 1):
+        t = i / DETECT_RATE
+        position = START + np.array([speed * max(t - move_after, 0.0), 0.0, 0.0])
+        pose_filter.update([0], [position + rng.normal(0.0, noise)], t)
+        moved = pose_filter.moved(overlay.MOTION_DISTANCE)
+        flagged += moved
+        # Latency and work time well within budget, so only motion decides
+        effort.observe(t, 0.02, 0.005, moved)
+        if recovered is None and t > move_after and effort.level == 0:
+            recovered = t
+    return flagged / count, effort, recovered
+
+
+def main():
+    failed = False
+    print(f"{DURATION:g} s at {DETECT_RATE:g} detections/s, {len(overlay.EFFORT_LEVELS)} effort levels")
+
+    for noise in NOISE:
+        flagged, effort, _ = simulate(noise)
+        ok = flagged <= MAX_FLAGGED and effort.level == len(effort.levels) - 1
+        failed |= not ok
+        print(f"  still, noise {noise}: {flagged:5.1%} flagged as motion, {effort.report()}  {'ok' if ok else 'FAIL'}")
+
+    for speed in SPEEDS:
+        # Moving from the start: never stepped down
+        flagged, effort, _ = simulate(NOISE[0], speed)
+        ok = effort.changes == 0
+        failed |= not ok
+        print(f"  moving {speed:g} m/s: {flagged:5.1%} flagged as motion, {effort.report()}  {'ok' if ok else 'FAIL'}")
+
+        # Still long enough to step all the way down, then moving: back to full effort
+        _, effort, recovered = simulate(NOISE[0], speed, MOVE_AFTER)
+        ok = recovered is not None
+        failed |= not ok
+        back = f"back to full effort {recovered - MOVE_AFTER:.2f} s after it started" if ok else "never back to full effort"
+        print(f"  still then {speed:g} m/s: {back}  {'ok' if ok else 'FAIL'}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# Compares the old per-frame preprocessing chain with rectify.Preprocessor.
+# Run from V0.5/:  python benchmarks/preprocess.py
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # for V0.5/ modules
+import rectify
+
+# === CONFIGURATION ===
+CALIB_YAML = "calibration/camera_calibration.yaml"
+FRAME_SIZE = (640, 480)
+ITERATIONS = 300
+# ======================
+
+
+def old_chain(frame, map1, map2):
+    # What overlay.py + hardware.undistort did: rotate, gray, remap, rotate again
+    frame = cv2.rotate(frame, cv2.ROTATE_180)
+    gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+    undist = cv2.remap(gray, map1, map2, interpolation=cv2.INTER_LINEAR)
+    return cv2.rotate(undist, cv2.ROTATE_180)
+
+
+def time_per_frame(fn, frames):
+    fn(frames[0]) # warm-up
+    start = time.perf_counter()
+    for i in range(ITERATIONS):
+        fn(frames[i % len(frames)])
+    return (time.perf_counter() - start) / ITERATIONS * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (FRAME_SIZE[1], FRAME_SIZE[0], 3), dtype=np.uint8) for _ in range(4)]
+
+    map1, map2, _ = rectify.undistort_maps(CALIB_YAML, FRAME_SIZE)
+    flip_map1, flip_map2, _ = rectify.undistort_maps(CALIB_YAML, FRAME_SIZE, flip_180=True)
+    fused = rectify.Preprocessor(FRAME_SIZE, flip_map1, flip_map2)
+
+    # The fused stage has to produce the same image as rotate -> gray -> remap
+    reference = cv2.remap(
+        cv2.cvtColor(cv2.rotate(frames[0], cv2.ROTATE_180), cv2.COLOR_RGB2GRAY),
+        map1, map2, interpolation=cv2.INTER_LINEAR,
+    )
+    diff = np.abs(fused(frames[0]).astype(int) - reference.astype(int))
+
+    old_ms = time_per_frame(lambda f: old_chain(f, map1, map2), frames)
+    fused_ms = time_per_frame(fused, frames)
+
+    print(f"Frame size {FRAME_SIZE[0]}x{FRAME_SIZE[1]}, {ITERATIONS} iterations")
+    print(f"  rotate + gray + remap + rotate : {old_ms:6.2f} ms/frame")
+    print(f"  fused gray + remap             : {fused_ms:6.2f} ms/frame ({old_ms / fused_ms:.1f}x)")
+    print(f"  pixel difference vs. rotate -> gray -> remap: max {diff.max()}, mean {diff.mean():.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# Recall and time per frame of each detector profile (detector.PROFILES).
+# Run from V0.5/:
+#   python benchmarks/profiles.py                     -> synthetic frames with known markers
+#   python benchmarks/profiles.py recordings/run1     -> frames from tests/record_frames.py
+#
+# Synthetic frames have ground truth, so recall is against the markers really in the frame
+# and corner error against their true corners. Recordings don't, so there recall is against
+# every marker any profile found in that frame.
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # for V0.5/ modules
+import detector
+import pipeline
+import rectify
+import sources
+import synthetic
+
+# === CONFIGURATION ===
+FRAME_SIZE = (640, 480)            # recordings are resized to this, like overlay.py's replay
+SYNTHETIC_SCENES = 48              # synthetic frames, from easy (few big markers) to hard
+SYNTHETIC_MARKERS = [1, 4, 9, 16]
+MARKER_FRACTIONS = [0.6, 0.3, 0.15]  # marker size in its grid cell - 0.15 of 16 markers is ~18 px
+SYNTHETIC_NOISE = [3.0, 8.0, 16.0]
+REPEATS = 3                        # times through the frame set, the median time is reported
+# ======================
+
+
+def synthetic_frames():
+    frames = []
+    for seed in range(SYNTHETIC_SCENES):
+        n = SYNTHETIC_MARKERS[seed % len(SYNTHETIC_MARKERS)]
+        noise = SYNTHETIC_NOISE[seed // len(SYNTHETIC_MARKERS) % len(SYNTHETIC_NOISE)]
+        fraction = MARKER_FRACTIONS[seed % len(MARKER_FRACTIONS)]
+        frames.append(synthetic.render_scene(FRAME_SIZE, n, seed=seed, marker_fraction=fraction, noise=noise))
+    return frames
+
+
+def recorded_frames(path):
+    # The same upright gray image overlay.py detects on (flip only, no rectification)
+    source = sources.VideoSource(path, size=FRAME_SIZE, fps=None, preload=True)
+    preprocess = rectify.Preprocessor(FRAME_SIZE, flip_180=True)
+    frames = []
+    source.start()
+    try:
+        while True:
+            frame = source.read()
+            frames.append((preprocess(frame.image).copy(), None))
+    except pipeline.EndOfStream:
+        pass
+    finally:
+        source.stop()
+    return frames
+
+
+def run_profile(marker_detector, frames):
+    """Returns ({frame index: {id: (4, 2) corners}}, median ms per frame)."""
+    found = {}
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for index, (gray, _) in enumerate(frames):
+            corners, ids = marker_detector.detect(gray)
+            if ids is not None:
+                found[index] = {int(i): c.reshape(4, 2) for i, c in zip(ids.flatten(), corners)}
+        times.append((time.perf_counter() - start) / len(frames) * 1000)
+    return found, float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OverlayPT detector profile benchmark")
+    parser.add_argument("recording", nargs="?", help="video file, image folder or glob (default: synthetic frames)")
+    args = parser.parse_args()
+
+    frames = recorded_frames(args.recording) if args.recording else synthetic_frames()
+    if not frames:
+        sys.exit(f"OverlayPT: No frames in {args.recording}")
+
+    results = {name: run_profile(detector.MarkerDetector(synthetic.DICTIONARY, profile=name), frames) for name in detector.PROFILES}
+
+    # What counts as "there": the ground truth, or everything any profile saw
+    reference = []
+    for index, (_, truth) in enumerate(frames):
+        if truth is not None:
+            reference.append(truth)
+        else:
+            seen = {}
+            for found, _ in results.values():
+                seen.update(found.get(index, {}))
+            reference.append(seen)
+    total = sum(len(markers) for markers in reference)
+
+    api = "ArucoDetector" if detector.HAS_ARUCO_DETECTOR else "legacy detectMarkers"
+    print(f"{len(frames)} {'recorded' if args.recording else 'synthetic'} frames, {total} markers, {api}")
+    for name, (found, ms) in results.items():
+        hits = 0
+        errors = []
+        for index, markers in enumerate(reference):
+            for marker_id, corners in found.get(index, {}).items():
+                if marker_id in markers:
+                    hits += 1
+                    if frames[index][1] is not None:
+                        errors.append(np.linalg.norm(corners - markers[marker_id], axis=1).mean())
+        recall = hits / total if total else float("nan")
+        error = f"  corner error {np.mean(errors):5.2f} px" if errors else ""
+        print(f"  {name:10s} {ms:7.2f} ms/frame  recall {recall:5.3f}{error}")
+
+
+if __name__ == "__main__":
+    main()
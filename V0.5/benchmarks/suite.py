@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# Benchmark suite for the overlay hot path: detection, pose, projection and display encoding.
+# Everything runs on synthetic data from fixed seeds, so results are comparable between runs.
+#
+# Run from V0.5/:
+#   python benchmarks/suite.py                          -> benchmarks/results/<date>.json
+#   python benchmarks/suite.py --compare old.json       -> also print the change per benchmark
+#   python benchmarks/suite.py --quick --filter detect  -> fewer iterations, only matching names
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # for V0.5/ modules
+import detector
+import hardware
+import poses
+import synthetic
+
+# === CONFIGURATION ===
+RESOLUTIONS    = [(640, 480), (1280, 720)]
+MARKER_COUNTS  = [1, 4, 16]
+PROJECT_COUNTS = [1, 10, 50]
+MARKER_LENGTH  = 0.1
+DETECT_PROFILE = "balanced" # detector.PROFILES entry timed under detect/ (overlay.py's default)
+CAMERA_MATRIX  = np.array([[742.0, 0, 320.0], [0, 742.0, 240.0], [0, 0, 1]]) # close to camera_calibration.yaml
+DIST_COEFFS    = np.zeros(5)
+# Display geometry from overlay.py
+DISPLAY_FROM_OBSERVER = np.array([-0.005, 0, 0.0383])
+SCREEN_ACTIVE_AREA    = np.array([0.04204, 0.02722])
+DISPLAY_RESOLUTION    = (128, 56)
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+# ======================
+
+
+def measure(fn, iterations, warmup=3):
+    """Calls fn() iterations times and returns per-call timing stats in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    times = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn()
+        times[i] = time.perf_counter() - start
+    times *= 1000
+    return {
+        "iterations": iterations,
+        "mean_ms": float(times.mean()),
+        "median_ms": float(np.median(times)),
+        "min_ms": float(times.min()),
+        "p95_ms": float(np.percentile(times, 95)),
+    }
+
+
+# Each bench_* yields (name, fn, iterations, extra fields for the results)
+# Detection and pose go through detector.py / poses.py, which work on both sides of the
+# OpenCV 4.7 ArUco API change, so the numbers stay comparable across upgrades
+def bench_detection():
+    marker_detector = detector.MarkerDetector(synthetic.DICTIONARY, profile=DETECT_PROFILE)
+    for size in RESOLUTIONS:
+        for n in MARKER_COUNTS:
+            gray, truth = synthetic.render_scene(size, n, seed=n)
+            _, ids = marker_detector.detect(gray)
+            found = 0 if ids is None else len(set(ids.flatten()) & set(truth))
+            yield f"detect/{size[0]}x{size[1]}/{n}", lambda gray=gray: marker_detector.detect(gray), 40, {"recall": found / n}
+
+
+def bench_pose():
+    marker_detector = detector.MarkerDetector(synthetic.DICTIONARY, profile=DETECT_PROFILE)
+    pose_engine = poses.PoseEngine(MARKER_LENGTH, CAMERA_MATRIX, DIST_COEFFS)
+    for n in MARKER_COUNTS:
+        gray, _ = synthetic.render_scene((640, 480), n, seed=n)
+        corners, ids = marker_detector.detect(gray)
+        yield f"pose/{n}", lambda corners=corners, ids=ids: pose_engine.estimate(corners, ids), 200, {}
+
+
+def bench_projection():
+    plane = hardware.DisplayPlane(DISPLAY_FROM_OBSERVER, SCREEN_ACTIVE_AREA[0], SCREEN_ACTIVE_AREA[1], DISPLAY_RESOLUTION)
+    projection = hardware.DisplayProjection(plane, np.zeros(3)) # vectors here are already relative to the observer
+    rng = np.random.default_rng(0)
+    for n in PROJECT_COUNTS:
+        vectors = rng.normal(0, 0.05, (n, 3)) + [0, 0, 0.5]
+
+        def scalar(vectors=vectors):
+            for vector in vectors:
+                hardware.intersect_display(DISPLAY_FROM_OBSERVER, SCREEN_ACTIVE_AREA[0], SCREEN_ACTIVE_AREA[1], DISPLAY_RESOLUTION, vector)
+
+        yield f"project/scalar/{n}", scalar, 300, {}
+        yield f"project/batched/{n}", lambda vectors=vectors: plane.intersect(vectors), 300, {}
+        yield f"project/matrix/{n}", lambda vectors=vectors: projection.project(vectors), 300, {}
+
+
+def bench_display_encoding():
+    size = (128, 64)
+    points = [(10, 10), (64, 32), (100, 50)]
+
+    def new_image_and_draw():
+        # What TransparentDisplay.point() used to do every call
+        image = Image.new("1", size)
+        draw = ImageDraw.Draw(image)
+        for point in points:
+            draw.point(point, fill=255)
+        return image
+
+    image = new_image_and_draw()
+    offsets = [(size[0] * (i // (size[0] * 8))) + (i % size[0]) for i in range(size[0] * size[1])]
+    masks = [1 << (i // size[0]) % 8 for i in range(size[0] * size[1])]
+
+    def luma_pack():
+        # Per-pixel Python loop, the same conversion luma's ssd1306.display() does
+        buf = bytearray(size[0] * size[1] // 8)
+        for idx, pix in enumerate(image.getdata()):
+            if pix > 0:
+                buf[offsets[idx]] |= masks[idx]
+        return buf
+
+    buffer = hardware.PageBuffer(*size)
+
+    def page_buffer_draw():
+        # What TransparentDisplay does now - bits set in place, already in the panel's format
+        buffer.clear()
+        for x, y in points:
+            buffer.set_pixel(x, y)
+        return buffer.pages
+
+    yield "display/pil_new_and_draw", new_image_and_draw, 500, {}
+    yield "display/pagebuffer_draw", page_buffer_draw, 500, {}
+    yield "display/pack_luma_loop", luma_pack, 100, {}
+    yield "display/pack_numpy", lambda: hardware.pack_pages(image), 500, {}
+
+
+BENCHMARKS = [bench_detection, bench_pose, bench_projection, bench_display_encoding]
+
+
+def metadata():
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "aruco_api": "ArucoDetector" if detector.HAS_ARUCO_DETECTOR else "legacy",
+        "numpy": np.__version__,
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    print(f"\nChange vs. {baseline_path} (median):")
+    for name, stats in results.items():
+        if name in baseline:
+            old, new = baseline[name]["median_ms"], stats["median_ms"]
+            print(f"  {name:32s} {old:9.3f} -> {new:9.3f} ms ({(new - old) / old * 100:+6.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OverlayPT benchmark suite")
+    parser.add_argument("--output", help="where to write the JSON results (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--quick", action="store_true", help="a tenth of the iterations, for a smoke test")
+    args = parser.parse_args()
+
+    results = {}
+    for bench in BENCHMARKS:
+        for name, fn, iterations, extra in bench():
+            if args.filter not in name:
+                continue
+            stats = measure(fn, max(3, iterations // 10) if args.quick else iterations)
+            stats.update(extra)
+            results[name] = stats
+            recall = f" recall {stats['recall']:.2f}" if "recall" in stats else ""
+            print(f"{name:32s} median {stats['median_ms']:9.3f} ms  p95 {stats['p95_ms']:9.3f} ms{recall}")
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(output, "w") as f:
+        json.dump({"meta": metadata(), "results": results}, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# Synthetic ArUco scenes for the benchmarks - reproducible from a seed, no camera needed.
+import cv2
+import numpy as np
+
+DICTIONARY = cv2.aruco.DICT_6X6_250
+
+
+def draw_marker(dictionary, marker_id, side):
+    # drawMarker was renamed generateImageMarker in OpenCV 4.7
+    if hasattr(cv2.aruco, "generateImageMarker"):
+        return cv2.aruco.generateImageMarker(dictionary, marker_id, side)
+    return cv2.aruco.drawMarker(dictionary, marker_id, side)
+
+
+def render_scene(size, n_markers, seed=0, marker_fraction=0.6, noise=4.0):
+    """
+    Renders n_markers ArUco markers with a little perspective onto a textured background.
+
+    Args:
+        size (tuple): (width, height) of the frame.
+        n_markers (int): How many markers, laid out on a grid so they never overlap.
+        seed (int): Same seed -> same frame.
+        marker_fraction (float): Marker size as a fraction of its grid cell.
+        noise (float): Standard deviation of the sensor noise added on top.
+
+    Returns:
+        (np.ndarray, dict): (height, width) uint8 gray frame and {marker id: (4, 2) corners}
+        in the same order detectMarkers reports them.
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    dictionary = cv2.aruco.getPredefinedDictionary(DICTIONARY)
+
+    # Smooth background with some structure so thresholding has something to reject
+    background = rng.integers(90, 200, (height // 16 + 1, width // 16 + 1), dtype=np.uint8)
+    frame = cv2.resize(background, (width, height), interpolation=cv2.INTER_CUBIC)
+
+    cols = int(np.ceil(np.sqrt(n_markers * width / height)))
+    rows = int(np.ceil(n_markers / cols))
+    cell = min(width / cols, height / rows)
+    side = cell * marker_fraction
+
+    ids = rng.choice(250, n_markers, replace=False)
+    truth = {}
+    for i, marker_id in enumerate(ids):
+        cx = (i % cols + 0.5) * width / cols + rng.uniform(-0.1, 0.1) * cell
+        cy = (i // cols + 0.5) * height / rows + rng.uniform(-0.1, 0.1) * cell
+
+        # Marker with its white quiet zone, warped onto a slightly skewed quad
+        marker = draw_marker(dictionary, int(marker_id), 120)
+        tile = cv2.copyMakeBorder(marker, 20, 20, 20, 20, cv2.BORDER_CONSTANT, value=255)
+        half = side / 2
+        quad = np.array([[-half, -half], [half, -half], [half, half], [-half, half]])
+        quad = quad + rng.uniform(-0.08, 0.08, (4, 2)) * side + [cx, cy]
+        corners_in_tile = np.float32([[19.5, 19.5], [139.5, 19.5], [139.5, 139.5], [19.5, 139.5]]) # outer edges, in pixel-centre coordinates
+        H = cv2.getPerspectiveTransform(corners_in_tile, quad.astype(np.float32))
+
+        warped = cv2.warpPerspective(tile, H, (width, height), flags=cv2.INTER_LINEAR)
+        mask = cv2.warpPerspective(np.full_like(tile, 255), H, (width, height), flags=cv2.INTER_NEAREST)
+        frame[mask > 0] = warped[mask > 0]
+        truth[int(marker_id)] = quad
+
+    frame = frame.astype(np.float32) + rng.normal(0, noise, frame.shape)
+    return np.clip(frame, 0, 255).astype(np.uint8), truth
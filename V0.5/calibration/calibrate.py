@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# Headless camera calibration from the checkerboard stills in stills/.
+#
+# Corner detection runs on all cores, and each image's corners are cached by the hash of the
+# file, so after adding a few stills only the new ones are processed. From a big still set
+# only a well-spread subset of views is used, and views that don't fit the solution
+# (blurred, misdetected corners) are dropped. The result goes to camera_calibration.yaml in
+# the format overlay.py reads.
+#
+#   python calibrate.py                       -> stills/*.jpg -> camera_calibration.yaml
+#   python calibrate.py --stills more/ --workers 2
+#   python calibrate.py --max-views 0 --keep-outliers   -> every view, like calibration_script.py used to
+import argparse
+import glob
+import hashlib
+import os
+import sys
+import time
+import cv2
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # for rectify.py in V0.5/
+import rectify
+
+# === CONFIGURATION ===
+CHECKERBOARD = (8, 5)  # inner corners per row, column
+SQUARE_SIZE  = 28.2    # in mm
+STILLS       = "stills/*.jpg"
+OUTPUT       = "camera_calibration.yaml"
+CORNER_CACHE = "corner_cache.npz"
+CACHE_VERSION = 1      # bump when the detection below changes, to redo every image
+MAX_VIEWS      = 25    # calibrate from at most this many well-spread views (0 = all of them)
+OUTLIER_FACTOR = 2.0   # drop views whose reprojection error is over this times the median
+MIN_VIEWS      = 10    # never drop below this many views
+COVERAGE_GRID  = (8, 6) # cells the image is split into for the coverage report
+# ======================
+
+# Criteria for termination of corner subpixel refinement
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+
+def board_points(checkerboard=CHECKERBOARD, square_size=SQUARE_SIZE):
+    # (0,0,0), (1*square_size,0,0), ..., (8*square_size,5*square_size,0)
+    objp = np.zeros((checkerboard[0] * checkerboard[1], 3), np.float32)
+    objp[:, :2] = np.mgrid[0:checkerboard[0], 0:checkerboard[1]].T.reshape(-1, 2)
+    return objp * square_size
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def find_corners(path, checkerboard=CHECKERBOARD):
+    """
+    Checkerboard corners in one image, refined to subpixel accuracy.
+
+    Returns:
+        (np.ndarray, tuple): (N, 1, 2) float32 corners, or an empty array if the board wasn't
+        found, and the image (width, height).
+    """
+    gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise IOError(f"OverlayPT: Cannot read calibration image: {path}")
+    found, corners = cv2.findChessboardCorners(gray, checkerboard, None)
+    if not found:
+        return np.empty((0, 1, 2), np.float32), gray.shape[::-1]
+    return cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), SUBPIX_CRITERIA), gray.shape[::-1]
+
+
+class CornerCache:
+    """
+    Per-image corner detections in one .npz, keyed by file hash + board size.
+
+    Args:
+        path (str): The .npz file - created on save() if it doesn't exist.
+        checkerboard (tuple): Part of every key, so changing the board redoes everything.
+    """
+
+    def __init__(self, path, checkerboard=CHECKERBOARD):
+        self.path = path
+        self.suffix = f"-{checkerboard[0]}x{checkerboard[1]}-v{CACHE_VERSION}"
+        self.entries = {}
+        if os.path.exists(path):
+            with np.load(path) as data:
+                self.entries = {key: data[key] for key in data.files}
+        self.changed = False
+
+    def get(self, digest):
+        """(corners, size) for an image hash, or None if it hasn't been processed."""
+        key = digest + self.suffix
+        if key + ".corners" not in self.entries:
+            return None
+        return self.entries[key + ".corners"], tuple(int(v) for v in self.entries[key + ".size"])
+
+    def put(self, digest, corners, size):
+        key = digest + self.suffix
+        self.entries[key + ".corners"] = corners
+        self.entries[key + ".size"] = np.array(size)
+        self.changed = True
+
+    def save(self, keep=None):
+        """
+        Writes the cache (only if something changed).
+
+        Args:
+            keep (set): Only keep entries for these hashes, e.g. the stills that still exist.
+        """
+        if keep is not None:
+            entries = {key: value for key, value in self.entries.items() if key.split("-", 1)[0] in keep}
+            self.changed |= len(entries) != len(self.entries)
+            self.entries = entries
+        if not self.changed:
+            return
+        tmp = self.path + ".tmp.npz" # np.savez appends .npz otherwise
+        np.savez(tmp, **self.entries)
+        os.replace(tmp, self.path)
+        self.changed = False
+
+
+def detect_all(paths, cache, workers=None, checkerboard=CHECKERBOARD):
+    """
+    Corners for every image, from the cache or found in a process pool.
+
+    Returns:
+        (list, int): (path, corners, size) per image in the order given, corners empty if
+        the board wasn't found, and how many images had to be processed.
+    """
+    digests = [file_hash(path) for path in paths]
+    results = {}
+    todo = []
+    for path, digest in zip(paths, digests):
+        cached = cache.get(digest)
+        if cached is None:
+            todo.append((path, digest))
+        else:
+            results[path] = cached
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            found = pool.map(find_corners, [path for path, _ in todo], [checkerboard] * len(todo))
+            for (path, digest), (corners, size) in zip(todo, found):
+                cache.put(digest, corners, size)
+                results[path] = (corners, size)
+    cache.save(keep=set(digests))
+    return [(path, *results[path]) for path in paths], len(todo)
+
+
+def calibrate(views, checkerboard=CHECKERBOARD, square_size=SQUARE_SIZE):
+    """
+    Args:
+        views (list): (path, corners, size) from detect_all(), only ones with corners.
+
+    Returns:
+        (float, np.ndarray, np.ndarray, np.ndarray): RMS reprojection error, camera matrix,
+        distortion and the RMS error of each view.
+    """
+    sizes = {size for _, _, size in views}
+    if len(sizes) != 1:
+        raise ValueError(f"OverlayPT: Calibration images have different sizes: {sorted(sizes)}")
+    objp = board_points(checkerboard, square_size)
+    rms, camera_matrix, dist_coeffs, _, _, _, _, per_view = cv2.calibrateCameraExtended(
+        [objp] * len(views), [corners for _, corners, _ in views], sizes.pop(), None, None
+    )
+    return rms, camera_matrix, dist_coeffs, per_view.ravel()
+
+
+def view_features(views, checkerboard=CHECKERBOARD, square_size=SQUARE_SIZE):
+    """
+    Where each board is in the image and how it is turned, as (N, 5) rows of
+    [centre x, centre y, size, tilt x, tilt y], all roughly in 0..1.
+
+    Uses a rough guess of the intrinsics (focal length = image width, no distortion), which
+    is plenty to tell the poses apart before calibrating.
+    """
+    objp = board_points(checkerboard, square_size)
+    features = np.empty((len(views), 5))
+    for row, (_, corners, (width, height)) in enumerate(views):
+        points = corners.reshape(-1, 2)
+        guess = np.array([[width, 0, width / 2], [0, width, height / 2], [0, 0, 1.0]])
+        _, rvec, _ = cv2.solvePnP(objp, points, guess, None)
+        normal = cv2.Rodrigues(rvec)[0][:, 2] # board normal in camera coordinates
+        span = np.ptp(points, axis=0)
+        features[row] = [points[:, 0].mean() / width, points[:, 1].mean() / height,
+                         np.hypot(*span) / np.hypot(width, height),
+                         (normal[0] + 1) / 2, (normal[1] + 1) / 2]
+    return features
+
+
+def select_views(views, count, keep=()):
+    """
+    Picks count views that spread over the image area and board poses (farthest-point
+    sampling on view_features()), starting from the view whose board covers the most of
+    the image. Calibration time grows with the number of views, while near-duplicate views
+    add little.
+
+    Args:
+        keep (list): Views (out of views) that have to be among the chosen - the rest are
+            picked to spread out from them. Used to refill a selection after dropping views.
+
+    Returns:
+        list: The chosen views, in their original order.
+    """
+    if count <= 0 or len(views) <= count:
+        return list(views)
+    features = view_features(views)
+    kept = {path for path, _, _ in keep}
+    chosen = [i for i, (path, _, _) in enumerate(views) if path in kept] or [int(np.argmax(features[:, 2]))]
+    distance = np.min([np.linalg.norm(features - features[i], axis=1) for i in chosen], axis=0)
+    while len(chosen) < count:
+        pick = int(np.argmax(distance))
+        chosen.append(pick)
+        distance = np.minimum(distance, np.linalg.norm(features - features[pick], axis=1))
+    return [views[i] for i in sorted(chosen)]
+
+
+def coverage(views, grid=COVERAGE_GRID):
+    """Fraction of the grid cells over the image that have at least one corner in them."""
+    cells = np.zeros(grid[::-1], dtype=bool)
+    for _, corners, (width, height) in views:
+        points = corners.reshape(-1, 2)
+        col = np.clip((points[:, 0] / width * grid[0]).astype(int), 0, grid[0] - 1)
+        row = np.clip((points[:, 1] / height * grid[1]).astype(int), 0, grid[1] - 1)
+        cells[row, col] = True
+    return cells.mean()
+
+
+def calibrate_robust(views, count=0, factor=OUTLIER_FACTOR, min_views=MIN_VIEWS):
+    """
+    calibrate() from select_views(views, count), then drop the views whose reprojection error
+    is over factor times the median, refill the selection from the views not used yet and
+    solve again, until every view fits (or only min_views are left to choose from).
+
+    Dropping happens before the selection is final, so an outlier doesn't cost a slot - the
+    spread-out views select_views() likes best are also the likeliest to be outliers.
+
+    Returns:
+        (float, np.ndarray, np.ndarray, list, list): RMS error, camera matrix, distortion,
+        the (view, error) pairs used and the (view, error) pairs dropped.
+    """
+    candidates = list(views)
+    selected = select_views(candidates, count)
+    dropped = []
+    while True:
+        rms, camera_matrix, dist_coeffs, errors = calibrate(selected)
+        limit = factor * np.median(errors)
+        worst = [i for i in np.argsort(errors)[::-1] if errors[i] > limit]
+        worst = worst[:max(0, len(candidates) - min_views)]
+        if not worst:
+            return rms, camera_matrix, dist_coeffs, list(zip(selected, errors)), dropped
+        dropped += [(selected[i], errors[i]) for i in worst]
+        gone = {selected[i][0] for i in worst}
+        candidates = [view for view in candidates if view[0] not in gone]
+        selected = select_views(candidates, count, keep=[view for view in selected if view[0] not in gone])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OverlayPT - camera calibration from checkerboard stills")
+    parser.add_argument("--stills", default=STILLS, help="folder or glob of calibration images")
+    parser.add_argument("--output", default=OUTPUT, help="calibration YAML to write")
+    parser.add_argument("--cache", default=CORNER_CACHE, help="per-image corner cache (.npz)")
+    parser.add_argument("--workers", type=int, help="corner detection processes (default: one per core)")
+    parser.add_argument("--max-views", type=int, default=MAX_VIEWS, help="calibrate from at most this many well-spread views (0 = all)")
+    parser.add_argument("--keep-outliers", action="store_true", help="don't drop views with a high reprojection error")
+    args = parser.parse_args()
+
+    pattern = os.path.join(args.stills, "*.jpg") if os.path.isdir(args.stills) else args.stills
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        raise FileNotFoundError(f"No images found for '{pattern}'.")
+
+    start = time.perf_counter()
+    cache = CornerCache(args.cache)
+    detections, processed = detect_all(paths, cache, args.workers)
+    print(f"Corners: {processed} new, {len(paths) - processed} cached ({time.perf_counter() - start:.2f} s)")
+
+    views = [view for view in detections if len(view[1])]
+    for path, corners, _ in detections:
+        if not len(corners):
+            print(f"Checkerboard not found in image {path}")
+    if not views:
+        raise RuntimeError("OverlayPT: No checkerboard found in any image")
+
+    start = time.perf_counter()
+    if args.keep_outliers:
+        selected = select_views(views, args.max_views)
+        rms, camera_matrix, dist_coeffs, errors = calibrate(selected)
+        used, dropped = list(zip(selected, errors)), []
+    else:
+        rms, camera_matrix, dist_coeffs, used, dropped = calibrate_robust(views, args.max_views)
+        selected = [view for view, _ in used]
+    if len(selected) < len(views):
+        print(f"Using {len(selected)} of {len(views)} views, coverage {coverage(selected):.0%} (all: {coverage(views):.0%})")
+
+    for (path, _, _), error in sorted(used, key=lambda item: -item[1]):
+        print(f"  {os.path.basename(path):20s} {error:.4f} px")
+    for (path, _, _), error in dropped:
+        print(f"  {os.path.basename(path):20s} {error:.4f} px  dropped")
+    print(f"Calibrated from {len(used)} images, RMS reprojection error {rms:.4f} px ({time.perf_counter() - start:.2f} s)")
+    print("Camera matrix:\n", camera_matrix)
+    print("Distortion coefficients:\n", dist_coeffs)
+
+    rectify.save_calibration(args.output, camera_matrix, dist_coeffs, rms)
+    print(f"Calibration data saved to '{args.output}'")
+
+
+if __name__ == "__main__":
+    main()
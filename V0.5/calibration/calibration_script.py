@@ -1,66 +1,7 @@
-import cv2
-import numpy as np
-import os
-import glob
+#!/usr/bin/env python3
+# Same as `python calibrate.py` - the calibration now runs headless, detects corners on all
+# cores and only processes stills it hasn't seen before (see calibrate.py).
+from calibrate import main
 
-# Checkerboard dimensions
-CHECKERBOARD = (8, 5)
-SQUARE_SIZE = 28.2  # in mm
-
-# Criteria for termination of corner subpixel refinement
-criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
-
-# Prepare object points (0,0,0), (1*square_size,0,0), ..., (8*square_size,5*square_size,0)
-objp = np.zeros((CHECKERBOARD[0]*CHECKERBOARD[1], 3), np.float32)
-objp[:, :2] = np.mgrid[0:CHECKERBOARD[0], 0:CHECKERBOARD[1]].T.reshape(-1, 2)
-objp *= SQUARE_SIZE
-
-# Arrays to store object points and image points from all images
-objpoints = []  # 3D points in real world space
-imgpoints = []  # 2D points in image plane
-
-# Load calibration images from folder (adjust path if needed)
-images = glob.glob('stills/*.jpg')
-
-if not images:
-    raise FileNotFoundError("No images found in 'stills/' folder.")
-
-for fname in images:
-    img = cv2.imread(fname)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
-    # Find the checkerboard corners
-    ret, corners = cv2.findChessboardCorners(gray, CHECKERBOARD, None)
-
-    if ret:
-        objpoints.append(objp)
-
-        # Refine pixel coordinates for given 2d points
-        corners2 = cv2.cornerSubPix(gray, corners, (11,11), (-1,-1), criteria)
-        imgpoints.append(corners2)
-
-        # Draw and display the corners
-        cv2.drawChessboardCorners(img, CHECKERBOARD, corners2, ret)
-        cv2.imshow('Checkerboard', img)
-        cv2.waitKey(100)
-    else:
-        print(f"Checkerboard not found in image {fname}")
-
-cv2.destroyAllWindows()
-
-# Calibrate the camera
-ret, camera_matrix, dist_coeffs, rvecs, tvecs = cv2.calibrateCamera(
-    objpoints, imgpoints, gray.shape[::-1], None, None
-)
-
-print("Camera matrix:\n", camera_matrix)
-print("Distortion coefficients:\n", dist_coeffs)
-
-# Save calibration results
-fs = cv2.FileStorage("camera_calibration.yaml", cv2.FILE_STORAGE_WRITE)
-fs.write("camera_matrix", camera_matrix)
-fs.write("distortion_coefficients", dist_coeffs)
-fs.write("reprojection_error", ret)
-fs.release()
-
-print("Calibration data saved to 'camera_calibration.yaml'")
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,21 @@
 #!/usr/bin/env python3
 import cv2
 import time
+import os
+import sys
 from picamera2 import Picamera2
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # for rectify.py in V0.5/
+import rectify
+
 # ?? Configuration ??
 CALIB_FILE    = "camera_calibration.yaml"
 PREVIEW_SIZE  = (640, 480)
 FLIP_180      = True    # set False if camera is upright
 WINDOW_NAME   = "Live Undistorted Preview (q to quit)"
 
-# ?? Load calibration ??
-fs = cv2.FileStorage(CALIB_FILE, cv2.FILE_STORAGE_READ)
-if not fs.isOpened():
-    raise IOError(f"Cannot open calibration file: {CALIB_FILE}")
-cam_mtx = fs.getNode("camera_matrix").mat()
-dist    = fs.getNode("distortion_coefficients").mat()
-fs.release()
-
-# ?? Precompute undistort map ??
-new_cam_mtx, roi = cv2.getOptimalNewCameraMatrix(
-    cam_mtx, dist, PREVIEW_SIZE, 1, PREVIEW_SIZE
-)
-map1, map2 = cv2.initUndistortRectifyMap(
-    cam_mtx, dist, None, new_cam_mtx, PREVIEW_SIZE, cv2.CV_16SC2
-)
+# ?? Load cached undistort map (rebuilt only when the calibration changes) ??
+map1, map2, new_cam_mtx = rectify.undistort_maps(CALIB_FILE, PREVIEW_SIZE, 1)
 
 # ?? Start camera ??
 picam2 = Picamera2()
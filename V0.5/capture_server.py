@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# Runs one camera and shares its frames through a ring.FrameRing, so the overlay, a preview
+# and a recorder can all read the same frames without each opening the camera:
+#
+#   python capture_server.py --camera 0                     -> ring "overlay-cam0"
+#   python overlay.py --ring overlay-cam0
+#   python tests/record_frames.py recording overlay-cam0
+#
+# Each frame is copied once, from the mapped camera buffer into its ring slot. Readers get
+# views into the ring, no copies or pickling.
+import argparse
+import signal
+import ring
+import sources
+
+# === CONFIGURATION ===
+CALIB_SIZE = (640, 480) # size the calibration was made at, see FRAME_SIZE in overlay.py
+RING_SLOTS = 8          # frames kept - a reader can fall this many - 1 behind before it misses any
+# ======================
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OverlayPT - share a camera's frames through shared memory")
+    parser.add_argument("--camera", type=int, default=0, help="CSI port, settings come from sources.CAMERA_SETTINGS")
+    parser.add_argument("--name", help="shared-memory name (default overlay-cam<camera>)")
+    parser.add_argument("--slots", type=int, default=RING_SLOTS, help="frames in the ring")
+    args = parser.parse_args()
+
+    camera = sources.PicameraSource.for_camera(args.camera, zero_copy=True, calib_size=CALIB_SIZE)
+    width, height = camera.output_size
+    gray = camera.stream == "lores" or camera.format == "YUV420"
+    meta = {
+        "camera": args.camera,
+        "flipped": camera.flipped,
+        "view": camera.view.tolist() if camera.view is not None else None,
+    }
+    name = args.name or f"overlay-cam{args.camera}"
+    frame_ring = ring.FrameRing.create(name, (height, width) if gray else (height, width, 3), slots=args.slots, meta=meta)
+
+    signal.signal(signal.SIGTERM, signal.default_int_handler) # clean up on kill as on Ctrl+C
+    camera.start()
+    print(f"OverlayPT: Sharing camera {args.camera} as '{name}' ({width}x{height}). Ctrl+C to stop.")
+    try:
+        while True:
+            frame = camera.read()
+            frame_ring.write(frame.image, frame.timestamp)
+            frame.release()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        camera.stop()
+        frame_ring.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+import cv2
+import numpy as np
+
+# ArUco marker detection for the overlay.
+# MarkerDetector wraps a plain full-frame search, PyramidDetector searches a downscaled
+# frame and refines on the full one, TrackingDetector only searches small regions around
+# markers it already knows about and falls back to a full scan now and then.
+# They all share detect(gray) -> (corners, ids), so they can be stacked.
+
+# OpenCV 4.7 replaced the detectMarkers() function with the ArucoDetector object (and
+# removed Dictionary_get / DetectorParameters_create). The Pi's packaged OpenCV is still
+# older, so both are supported.
+HAS_ARUCO_DETECTOR = hasattr(cv2.aruco, "ArucoDetector")
+
+# Named DetectorParameters settings, timed and checked for recall with benchmarks/profiles.py.
+# Every adaptive threshold window size is a full pass over the frame, so the window range
+# is most of the difference in speed.
+PROFILES = {
+    "fast": { # two threshold passes, no corner refinement, skips markers under ~10 px a side at 640x480
+        "adaptiveThreshWinSizeMin": 5,
+        "adaptiveThreshWinSizeMax": 15,
+        "adaptiveThreshWinSizeStep": 10,
+        "minMarkerPerimeterRate": 0.06,
+        "cornerRefinementMethod": cv2.aruco.CORNER_REFINE_NONE,
+    },
+    "balanced": { # three threshold passes, subpixel corners for a steadier pose
+        "adaptiveThreshWinSizeMin": 5,
+        "adaptiveThreshWinSizeMax": 25,
+        "adaptiveThreshWinSizeStep": 10,
+        "minMarkerPerimeterRate": 0.03,
+        "cornerRefinementMethod": cv2.aruco.CORNER_REFINE_SUBPIX,
+        "cornerRefinementWinSize": 3, # the default 5 pulls corners of small markers off
+    },
+    "accurate": { # six threshold passes, and smaller (further away) markers
+        "adaptiveThreshWinSizeMin": 5,
+        "adaptiveThreshWinSizeMax": 35,
+        "adaptiveThreshWinSizeStep": 6,
+        "minMarkerPerimeterRate": 0.015,
+        "cornerRefinementMethod": cv2.aruco.CORNER_REFINE_SUBPIX,
+        "cornerRefinementWinSize": 3,
+        "cornerRefinementMaxIterations": 50,
+        "perspectiveRemovePixelPerCell": 8,
+    },
+}
+
+
+def make_parameters(profile="balanced", **overrides):
+    """
+    DetectorParameters for one of PROFILES, with any field overridden by keyword, e.g.
+    make_parameters("fast", minMarkerPerimeterRate=0.1).
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"OverlayPT: Unknown detector profile '{profile}' (have {', '.join(PROFILES)})")
+    parameters = cv2.aruco.DetectorParameters() if HAS_ARUCO_DETECTOR else cv2.aruco.DetectorParameters_create()
+    for name, value in {**PROFILES[profile], **overrides}.items():
+        setattr(parameters, name, value)
+    return parameters
+
+
+class MarkerDetector:
+    """
+    Full-frame ArUco search.
+
+    Args:
+        dictionary (int): A cv2.aruco.DICT_* constant.
+        parameters: DetectorParameters to use as they are, or None for the profile's.
+        profile (str): Name in PROFILES, used when parameters is None.
+    """
+
+    def __init__(self, dictionary=cv2.aruco.DICT_6X6_250, parameters=None, profile="balanced"):
+        self.dictionary = cv2.aruco.getPredefinedDictionary(dictionary)
+        self.parameters = parameters if parameters is not None else make_parameters(profile)
+        self.profile = profile if parameters is None else None
+        self.default_windows = self.threshold_windows
+        self._detector = cv2.aruco.ArucoDetector(self.dictionary, self.parameters) if HAS_ARUCO_DETECTOR else None
+
+    @property
+    def threshold_windows(self):
+        parameters = self.parameters
+        return parameters.adaptiveThreshWinSizeMin, parameters.adaptiveThreshWinSizeMax, parameters.adaptiveThreshWinSizeStep
+
+    def set_threshold_windows(self, windows=None):
+        """
+        Adaptive threshold window sizes to try as (min, max, step) in pixels - one
+        thresholding pass per size. None goes back to the ones the detector started with.
+        """
+        low, high, step = windows if windows is not None else self.default_windows
+        self.parameters.adaptiveThreshWinSizeMin = low
+        self.parameters.adaptiveThreshWinSizeMax = high
+        self.parameters.adaptiveThreshWinSizeStep = step
+        if self._detector is not None:
+            self._detector.setDetectorParameters(self.parameters) # the detector keeps its own copy
+
+    def detect(self, gray):
+        """Same output as cv2.aruco.detectMarkers: (corners, ids), ids is None if nothing was found."""
+        if self._detector is not None:
+            corners, ids, _ = self._detector.detectMarkers(gray)
+        else:
+            corners, ids, _ = cv2.aruco.detectMarkers(gray, self.dictionary, parameters=self.parameters)
+        return corners, ids
+
+
+class PyramidDetector:
+    """
+    Finds markers on a downscaled copy of the frame, then refines their corners on the
+    full-resolution image with cornerSubPix.
+
+    Candidate search (thresholding, contours) scales with the pixel count, so this costs
+    about as much as detecting at the low resolution, while the corners keep full-res accuracy.
+
+    Args:
+        detector (MarkerDetector): Runs on the downscaled image.
+        scale (float): Downscale factor for the search, e.g. 0.5 for 1280x720 -> 640x360.
+            Can be changed between frames (see governor.py), 1.0 searches the frame as it is.
+        refine_window (int): Half size of the cornerSubPix search window in full-res pixels.
+            Should be at least about 1 / scale so it covers the error of the coarse corners.
+            Default: follows the scale.
+    """
+
+    REFINE_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.01)
+
+    def __init__(self, detector, scale=0.5, refine_window=None):
+        self.detector = detector
+        self.scale = scale
+        self._refine_window = refine_window
+        self._small = None # downscaled frame, reused while the input size stays the same
+
+    @property
+    def refine_window(self):
+        return self._refine_window if self._refine_window is not None else max(3, int(round(2 / self.scale)))
+
+    def detect(self, gray):
+        if self.scale == 1.0:
+            return self.detector.detect(gray) # nothing to refine
+        height, width = gray.shape[:2]
+        small_size = (max(1, int(round(width * self.scale))), max(1, int(round(height * self.scale))))
+        if self._small is None or self._small.shape[::-1] != small_size:
+            self._small = np.empty(small_size[::-1], dtype=np.uint8)
+        cv2.resize(gray, small_size, dst=self._small, interpolation=cv2.INTER_AREA)
+
+        corners, ids = self.detector.detect(self._small)
+        if ids is None:
+            return corners, ids
+
+        # Back to full-res pixel coordinates (pixel centres, not pixel edges, line up)
+        scale = np.array([width / small_size[0], height / small_size[1]], dtype=np.float32)
+        points = (np.concatenate(corners).reshape(-1, 2) + 0.5) * scale - 0.5
+
+        # One cornerSubPix call for every corner of every marker
+        window = (self.refine_window, self.refine_window)
+        points = cv2.cornerSubPix(gray, points.reshape(-1, 1, 2), window, (-1, -1), self.REFINE_CRITERIA)
+        return tuple(points.reshape(-1, 1, 4, 2)), ids
+
+
+class TrackingDetector:
+    """
+    Searches only an expanded ROI around each marker seen in the previous frame.
+
+    A full-frame scan still runs every full_scan_interval frames (to pick up new markers),
+    and straight away whenever a tracked marker is not found inside its ROI.
+
+    Args:
+        detector (MarkerDetector): Does the actual detection, on the full frame or an ROI.
+        full_scan_interval (int): Frames between forced full-frame scans.
+        margin (float): How far to grow each ROI on every side, as a fraction of the
+            marker's bounding box size. Should cover how far a marker can move in one frame.
+        min_roi (int): Smallest ROI side in pixels, so tiny markers still get some context.
+    """
+
+    def __init__(self, detector, full_scan_interval=15, margin=0.5, min_roi=48):
+        self.detector = detector
+        self.full_scan_interval = full_scan_interval
+        self.margin = margin
+        self.min_roi = min_roi
+
+        self.tracks = {} # marker id -> (1, 4, 2) corners from the last frame it was seen
+        self.frames_since_scan = 0
+        self.full_scans = 0
+        self.roi_scans = 0
+
+    def reset(self):
+        self.tracks = {}
+
+    def detect(self, gray):
+        if not self.tracks or self.frames_since_scan >= self.full_scan_interval:
+            return self._full_scan(gray)
+
+        found = {}
+        for marker_id, marker_corners in self.tracks.items():
+            if marker_id in found:
+                continue # already picked up inside a neighbouring ROI
+            x0, y0, x1, y1 = self._roi(marker_corners, gray.shape)
+            corners, ids = self.detector.detect(gray[y0:y1, x0:x1])
+            if ids is None:
+                continue
+            for roi_corners, roi_id in zip(corners, ids.flatten()):
+                if roi_id not in found:
+                    found[roi_id] = roi_corners + np.array([x0, y0], dtype=np.float32)
+
+        self.roi_scans += 1
+        if not all(marker_id in found for marker_id in self.tracks):
+            return self._full_scan(gray) # lost a marker - it may have moved further than the margin
+
+        self.tracks = found
+        self.frames_since_scan += 1
+        return self._as_detections(found)
+
+    def _full_scan(self, gray):
+        corners, ids = self.detector.detect(gray)
+        self.full_scans += 1
+        self.frames_since_scan = 0
+        self.tracks = {} if ids is None else dict(zip(ids.flatten(), corners))
+        return corners, ids
+
+    def _roi(self, corners, shape):
+        # Bounding box of the corners, grown by margin on every side and clipped to the frame
+        height, width = shape[:2]
+        points = corners.reshape(-1, 2)
+        (x_min, y_min), (x_max, y_max) = points.min(axis=0), points.max(axis=0)
+        grow_x = max((x_max - x_min) * self.margin, (self.min_roi - (x_max - x_min)) / 2)
+        grow_y = max((y_max - y_min) * self.margin, (self.min_roi - (y_max - y_min)) / 2)
+        x0 = int(max(0, np.floor(x_min - grow_x)))
+        y0 = int(max(0, np.floor(y_min - grow_y)))
+        x1 = int(min(width, np.ceil(x_max + grow_x) + 1))
+        y1 = int(min(height, np.ceil(y_max + grow_y) + 1))
+        return x0, y0, x1, y1
+
+    @staticmethod
+    def _as_detections(found):
+        if not found:
+            return (), None
+        ids = np.array(list(found.keys()), dtype=np.int32).reshape(-1, 1)
+        return tuple(found.values()), ids
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+import threading
+import numpy as np
+
+# Temporal filtering of marker positions for overlay.py.
+# Every marker ID (or marker layout, see poses.py) gets a constant-velocity Kalman filter on its position. Detections update it
+# whenever they come in, and the display predicts from it at its own (higher) rate, so the
+# dot moves smoothly between detections instead of jittering with every raw pose.
+
+
+class MarkerTrack:
+    """
+    Constant-velocity Kalman filter for one marker's position (x, y, z in meters).
+
+    The state is position + velocity. The axes are independent, so instead of 6x6 matrices
+    each axis is a 2-state filter and the three run side by side on (3,) arrays.
+
+    Args:
+        position (np.ndarray): First measured position.
+        timestamp (float): When it was measured (seconds).
+        process_noise (float): How much the velocity may change - white-noise acceleration
+            density in m^2/s^3. Higher follows quick head movements better, lower is smoother.
+        measurement_noise (np.ndarray): Variance of a single measurement per axis in m^2.
+    """
+
+    def __init__(self, position, timestamp, process_noise, measurement_noise):
+        self.position = np.array(position, dtype=np.float64)
+        self.velocity = np.zeros(3)
+        self.timestamp = timestamp
+        self.process_noise = process_noise
+        self.measurement_noise = np.asarray(measurement_noise, dtype=np.float64)
+
+        # Covariance [[p00, p01], [p01, p11]] per axis - velocity starts out unknown
+        self.p00 = self.measurement_noise.copy()
+        self.p01 = np.zeros(3)
+        self.p11 = np.full(3, 1.0)
+
+        # Where the marker was last known to be at rest, see PoseFilter.moved()
+        self.anchor = self.position.copy()
+        self.anchor_variance = self.p00.copy()
+
+    def update(self, position, timestamp):
+        # Predict up to the measurement
+        dt = max(timestamp - self.timestamp, 0.0)
+        q = self.process_noise
+        self.position = self.position + self.velocity * dt
+        self.p00 = self.p00 + 2 * dt * self.p01 + dt * dt * self.p11 + q * dt ** 3 / 3
+        self.p01 = self.p01 + dt * self.p11 + q * dt ** 2 / 2
+        self.p11 = self.p11 + q * dt
+        self.timestamp = timestamp
+
+        # Correct with it
+        innovation = position - self.position
+        s = self.p00 + self.measurement_noise
+        k0, k1 = self.p00 / s, self.p01 / s
+        self.position = self.position + k0 * innovation
+        self.velocity = self.velocity + k1 * innovation
+        self.p11 = self.p11 - k1 * self.p01
+        self.p01 = (1 - k0) * self.p01
+        self.p00 = (1 - k0) * self.p00
+
+    def predict(self, timestamp):
+        """Position expected at timestamp, without changing the filter."""
+        return self.position + self.velocity * (timestamp - self.timestamp)
+
+
+class PoseFilter:
+    """
+    One MarkerTrack per key (marker ID or layout name), safe to update from one thread and
+    predict from another.
+
+    Args:
+        process_noise (float): See MarkerTrack.
+        measurement_noise (tuple): See MarkerTrack. Depth (z) from a single marker is a lot
+            noisier than x/y, so give it a bigger variance.
+        max_age (float): Seconds without a detection before a marker is dropped.
+        max_prediction (float): Never extrapolate further than this past the last detection,
+            so a marker that stopped being seen doesn't drift off.
+    """
+
+    def __init__(self, process_noise=0.05, measurement_noise=(4e-6, 4e-6, 1e-4), max_age=0.5, max_prediction=0.1):
+        self.process_noise = process_noise
+        self.measurement_noise = np.asarray(measurement_noise, dtype=np.float64)
+        self.max_age = max_age
+        self.max_prediction = max_prediction
+        self.tracks = {}
+        self._lock = threading.Lock()
+
+    def update(self, ids, positions, timestamp):
+        """
+        Adds one frame's detections.
+
+        Args:
+            ids (list): N marker IDs / layout names.
+            positions (np.ndarray): (N, 3) positions in the same order.
+            timestamp (float): Capture time of the frame they were found in.
+        """
+        with self._lock:
+            for marker_id, position in zip(ids, positions):
+                track = self.tracks.get(marker_id)
+                if track is None:
+                    self.tracks[marker_id] = MarkerTrack(position, timestamp, self.process_noise, self.measurement_noise)
+                else:
+                    track.update(position, timestamp)
+
+    def moved(self, distance, significance=3.0):
+        """
+        Whether any marker has really moved since it last did (or since it appeared).
+
+        The filtered velocity alone is no good for this: with the measurement noise above it
+        swings by several cm/s on a marker that is perfectly still. Instead each track keeps
+        an anchor - its filtered position when it last moved - and only counts as moving once
+        it is more than distance away from it and that displacement is significant against
+        the noise of both positions. Slow movements add up until they count too.
+
+        Args:
+            distance (float): Smallest displacement in meters that counts.
+            significance (float): How many standard deviations of position noise the
+                displacement has to exceed.
+        """
+        moved = False
+        with self._lock:
+            for track in self.tracks.values():
+                displacement = np.linalg.norm(track.position - track.anchor)
+                noise = np.sqrt(np.sum(track.p00 + track.anchor_variance))
+                if displacement > max(distance, significance * noise):
+                    track.anchor = track.position.copy()
+                    track.anchor_variance = track.p00.copy()
+                    moved = True
+        return moved
+
+    def predict(self, timestamp):
+        """
+        Where every live marker is expected to be at timestamp.
+
+        Returns:
+            (list, np.ndarray, np.ndarray): N keys, (N, 3) positions and (N,) how far
+            each one was extrapolated past its last detection in seconds.
+        """
+        with self._lock:
+            for marker_id in [i for i, track in self.tracks.items() if timestamp - track.timestamp > self.max_age]:
+                del self.tracks[marker_id]
+            ids = list(self.tracks)
+            positions = np.empty((len(ids), 3))
+            horizons = np.empty(len(ids))
+            for row, track in enumerate(self.tracks.values()):
+                horizons[row] = min(timestamp - track.timestamp, self.max_prediction)
+                positions[row] = track.predict(track.timestamp + horizons[row])
+        return ids, positions, horizons
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+# Adaptive detection effort for overlay.py.
+# Detection is where the CPU time goes, and most of the time it isn't needed at full effort:
+# when the markers (and the head) are still, the pose filter holds them fine on fewer, cheaper
+# detections. The Governor watches how long detections take and how fast the markers move, and
+# picks one of a list of effort levels - detection rate, detection scale and adaptive
+# threshold windows - stepping down while the scene is static or the CPU can't keep up,
+# and jumping back up as soon as something moves.
+
+
+class EffortLevel:
+    """
+    One set of detection settings.
+
+    Args:
+        detect_rate (float): Detections per second (0 = every camera frame).
+        scale (float): Scale the marker search runs at (see detector.PyramidDetector).
+        threshold_windows (tuple): (min, max, step) of the adaptive threshold window sizes
+            in pixels, or None for the detector profile's own. Every window size is one
+            thresholding pass over the frame.
+    """
+
+    def __init__(self, detect_rate, scale=1.0, threshold_windows=None):
+        self.detect_rate = detect_rate
+        self.scale = scale
+        self.threshold_windows = tuple(threshold_windows) if threshold_windows is not None else None
+
+    def __repr__(self):
+        rate = f"{self.detect_rate:g}/s" if self.detect_rate else "every frame"
+        if self.threshold_windows is None:
+            return f"{rate}, scale {self.scale:g}, profile windows"
+        low, high, step = self.threshold_windows
+        return f"{rate}, scale {self.scale:g}, windows {low}-{high}/{step}"
+
+
+class Governor:
+    """
+    Picks an EffortLevel from how the last detections went.
+
+    - Over the latency budget (or busy for more than max_duty of the time): one level less
+      effort every overload_hold seconds, and that level becomes the most effort allowed
+      until detections have been comfortably within budget for recover_hold seconds.
+    - Markers moving, appearing or disappearing: straight back to the most effort allowed.
+      Whether they move is up to the caller - it should be a test that pose noise alone
+      doesn't pass (filters.PoseFilter.moved()), or the governor never sees a still scene.
+    - Nothing moving for static_hold seconds: one level less effort, again every static_hold.
+
+    Args:
+        levels (list): EffortLevels, most effort first.
+        latency_budget (float): Seconds from exposure to a filtered pose that detections
+            should stay within.
+        static_hold (float): Seconds of stillness before each step down.
+        overload_hold (float): Seconds between step downs while over budget.
+        recover_hold (float): Seconds within budget before one more level is allowed again.
+        max_duty (float): Largest fraction of the time detection may keep its thread busy.
+        headroom (float): "Comfortably within budget" - this fraction of the budget and duty.
+        smoothing (float): Weight of each new sample in the running averages.
+    """
+
+    def __init__(self, levels, latency_budget=0.06, static_hold=2.0, overload_hold=0.5,
+                 recover_hold=5.0, max_duty=0.8, headroom=0.6, smoothing=0.2):
+        if not levels:
+            raise ValueError("OverlayPT: The governor needs at least one effort level")
+        self.levels = list(levels)
+        self.latency_budget = latency_budget
+        self.static_hold = static_hold
+        self.overload_hold = overload_hold
+        self.recover_hold = recover_hold
+        self.max_duty = max_duty
+        self.headroom = headroom
+        self.smoothing = smoothing
+
+        self.level = 0 # index into levels, 0 = most effort
+        self.ceiling = 0 # most effort currently allowed
+        self.latency = None # running averages, seconds
+        self.work_time = None
+        self.changes = 0 # level changes so far, for the stats
+        self._changed_at = float("-inf")
+        self._still_since = None
+        self._within_since = None
+        self._last_detection = None
+
+    @property
+    def settings(self):
+        return self.levels[self.level]
+
+    def observe(self, timestamp, latency, work_time, moved, markers_changed=False):
+        """
+        Feeds in one detection and returns the EffortLevel to use from now on.
+
+        Args:
+            timestamp (float): Capture time of the frame (seconds).
+            latency (float): Exposure -> filtered pose for it.
+            work_time (float): Time spent detecting and posing it.
+            moved (bool): A marker moved (filters.PoseFilter.moved()).
+            markers_changed (bool): A marker appeared or was lost in this frame.
+        """
+        a = self.smoothing
+        self.latency = latency if self.latency is None else self.latency + a * (latency - self.latency)
+        self.work_time = work_time if self.work_time is None else self.work_time + a * (work_time - self.work_time)
+
+        # Busy fraction at the rate detections are actually running at
+        interval = None if self._last_detection is None else timestamp - self._last_detection
+        self._last_detection = timestamp
+        duty = self.work_time / interval if interval and interval > 0 else 0.0
+
+        overloaded = self.latency > self.latency_budget or duty > self.max_duty
+        comfortable = self.latency < self.headroom * self.latency_budget and duty < self.headroom * self.max_duty
+        moving = markers_changed or moved
+
+        if overloaded:
+            self._within_since = None
+            if timestamp - self._changed_at >= self.overload_hold and self.level < len(self.levels) - 1:
+                self.ceiling = self.level + 1
+                self._set_level(self.level + 1, timestamp)
+        else:
+            # Give effort back one level at a time once there's been room for a while
+            if not comfortable:
+                self._within_since = None
+            elif self._within_since is None:
+                self._within_since = timestamp
+            elif self.ceiling > 0 and timestamp - self._within_since >= self.recover_hold:
+                self.ceiling -= 1
+                self._within_since = timestamp
+
+            if moving:
+                self._still_since = None
+                if self.level > self.ceiling:
+                    self._set_level(self.ceiling, timestamp)
+            else:
+                if self._still_since is None:
+                    self._still_since = timestamp
+                still_for = timestamp - max(self._still_since, self._changed_at)
+                if still_for >= self.static_hold and self.level < len(self.levels) - 1:
+                    self._set_level(self.level + 1, timestamp)
+                elif self.level < self.ceiling:
+                    self._set_level(self.ceiling, timestamp)
+
+        return self.settings
+
+    def _set_level(self, level, timestamp):
+        if level != self.level:
+            self.level = level
+            self.changes += 1
+            self._changed_at = timestamp
+
+    def report(self):
+        return f"effort level {self.level} ({self.settings}), {self.changes} changes"
@@ -1,40 +1,333 @@
 #!/usr/bin/env python3
 # aa '25
-from luma.core.interface.serial import i2c, spi
-from luma.core.render import canvas
-from luma.oled.device import ssd1309
+import collections
 from PIL import ImageFont, Image, ImageDraw
 from time import sleep
+import time
 import numpy
 import cv2
 import numpy as np
 # Create an interface for the SSD1309. Only needs basic functionality, such as:
 # Draw a point onto the screen at certain coordinates.
+# Compose several points, crosshairs, polygons and text into one frame.
+
+# SSD1309 addressing commands (horizontal addressing mode, as set up by luma)
+SET_COLUMN_ADDR = 0x21
+SET_PAGE_ADDR = 0x22
+
+# Writes closer together than this many bytes are merged into one bulk transfer - each
+# separate write costs a command (6 bytes) plus the I2C start/address overhead
+WRITE_OVERHEAD = 8
+
+TEXT_CACHE_SIZE = 32 # rendered strings kept by TransparentDisplay.draw_text, least recently drawn go first
+
+
+class PageBuffer:
+    """
+    1-bit framebuffer kept in the SSD1309's own memory layout, so it can be sent as it is.
+
+    pages is (height // 8, width) uint8: one byte per column per 8-row page, top row of the
+    page in bit 0 (the same layout pack_pages() produces). Drawing sets and clears bits in
+    place - no PIL image per frame and no conversion before sending.
+
+    Args:
+        width, height (int): Panel size in pixels, height a multiple of 8.
+    """
+
+    def __init__(self, width=128, height=64):
+        self.width = width
+        self.height = height
+        self.pages = np.zeros((height // 8, width), dtype=np.uint8)
+
+    def clear(self):
+        self.pages.fill(0)
+
+    def set_pixel(self, x, y, on=True):
+        x, y = int(x), int(y)
+        if 0 <= x < self.width and 0 <= y < self.height: # off-screen is clipped like PIL does
+            if on:
+                self.pages[y >> 3, x] |= 1 << (y & 7)
+            else:
+                self.pages[y >> 3, x] &= ~(1 << (y & 7)) & 0xFF
+
+    def set_pixels(self, xs, ys, on=True):
+        """Many pixels at once, xs and ys as arrays. Off-screen ones are skipped."""
+        xs = np.asarray(xs, dtype=np.int64).ravel()
+        ys = np.asarray(ys, dtype=np.int64).ravel()
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        xs, ys = xs[inside], ys[inside]
+        bits = np.left_shift(1, ys & 7).astype(np.uint8)
+        if on:
+            np.bitwise_or.at(self.pages, (ys >> 3, xs), bits)
+        else:
+            np.bitwise_and.at(self.pages, (ys >> 3, xs), ~bits)
+
+    def line(self, x0, y0, x1, y1, on=True):
+        # Bresenham in closed form, so it lights exactly the pixels PIL's line() does
+        x0, y0, x1, y1 = int(x0), int(y0), int(x1), int(y1)
+        dx, dy = abs(x1 - x0), abs(y1 - y0)
+        x_step, y_step = (1 if x1 >= x0 else -1), (1 if y1 >= y0 else -1)
+        i = np.arange(max(dx, dy) + 1)
+        if dx >= dy:
+            xs = x0 + x_step * i
+            ys = y0 + y_step * ((2 * i * dy + dx) // (2 * dx)) if dx else np.full_like(i, y0)
+        else:
+            ys = y0 + y_step * i
+            xs = x0 + x_step * ((2 * i * dx + dy) // (2 * dy))
+        self.set_pixels(xs, ys, on)
+
+    def polygon(self, points, on=True):
+        """Outline through points, closed back to the first one."""
+        points = [tuple(p) for p in points]
+        for (x0, y0), (x1, y1) in zip(points, points[1:] + points[:1]):
+            self.line(x0, y0, x1, y1, on)
+
+    def blit(self, mask, x, y, on=True):
+        """Sets the pixels where the (h, w) bool mask is True, with its top-left at (x, y)."""
+        ys, xs = np.nonzero(mask)
+        self.set_pixels(xs + int(x), ys + int(y), on)
+
+    def pixels(self):
+        """(height, width) bool array of the buffer."""
+        return unpack_pages(self.pages)
+
 
 class TransparentDisplay:
-    def __init__(self, type="ssd1309", address=0x3C):
+    """
+    Args:
+        type (str): Display controller, only "ssd1309" for now.
+        address (int): I2C address of the module.
+        retained (bool): Only send the 8-row pages (and the column range within them) that
+            changed since the last frame. With retained=False every commit pushes the whole
+            128x64 frame.
+        device: Anything that behaves like luma's ssd1309 device (e.g. FakeSSD1309). If None,
+            the real display is opened on I2C bus 1. Only luma's command() and data() are
+            used - frames never go through its PIL-based display(), so its rotate option has
+            no effect.
+    """
+
+    def __init__(self, type="ssd1309", address=0x3C, retained=True, device=None):
         self.type = type
         self.address = address # in some displays/modules it may be 0x3D
+        self.retained = retained
 
-        serial = i2c(port=1, address=self.address)
-        self.device = ssd1309(serial)
+        if device is None:
+            # Only needed for the real display, so replays can run on machines without luma
+            from luma.core.interface.serial import i2c
+            from luma.oled.device import ssd1309
 
-    
-    def point(self, coords, brightness=1): # -> coords is a 1-dimensional numpy array containg [x, y]
+            serial = i2c(port=1, address=self.address)
+            device = ssd1309(serial)
+        self.device = device
+
+        # Retained framebuffer in the panel's page format, drawn into in place
+        self.buffer = PageBuffer(*self.device.size)
+        self.font = ImageFont.load_default()
+        self._text_masks = collections.OrderedDict() # text -> rendered bool mask, so PIL only runs for new strings
+        self._sent = None # page bytes (pages, width) currently on the panel, None if unknown
+        self.bytes_sent = 0 # running total of data bytes pushed over I2C
+
+    # FRAME COMPOSITION - begin_frame(), any number of draw_*() calls, then commit().
+    # Everything drawn in between goes out in a single transfer.
+    # Anything with brightness > 0 is lit - the panel is 1-bit.
+    def begin_frame(self):
+        self.buffer.clear()
 
-        image = Image.new("1", self.device.size) # probably can be optimised
-        draw = ImageDraw.Draw(image)
+    def draw_point(self, x, y, brightness=1):
+        self.buffer.set_pixel(x, y, brightness > 0)
 
-        x = coords[0]
-        y = coords[1]
+    def draw_crosshair(self, x, y, size=2, brightness=1):
+        self.buffer.line(x - size, y, x + size, y, brightness > 0)
+        self.buffer.line(x, y - size, x, y + size, brightness > 0)
+
+    def draw_polygon(self, points, brightness=1): # e.g. the 4 corners of a marker, in order around the shape
+        self.buffer.polygon(points, brightness > 0)
+
+    def draw_text(self, text, x, y, brightness=1):
+        mask = self._text_masks.get(text)
+        if mask is None:
+            _, _, right, bottom = self.font.getbbox(text)
+            image = Image.new("1", (max(right, 1), max(bottom, 1)))
+            ImageDraw.Draw(image).text((0, 0), text, font=self.font, fill=255)
+            mask = self._text_masks[text] = np.asarray(image, dtype=bool)
+            if len(self._text_masks) > TEXT_CACHE_SIZE: # changing text (distances, FPS) would grow it forever
+                self._text_masks.popitem(last=False)
+        else:
+            self._text_masks.move_to_end(text)
+        self.buffer.blit(mask, x, y, brightness > 0)
+
+    def commit(self):
+        if self.retained:
+            self.flush()
+        else:
+            pages = self.buffer.pages
+            self._write(0, pages.shape[0] - 1, 0, pages.shape[1] - 1, pages)
+            self._sent = None
+
+    def point(self, coords, brightness=1): # -> coords is a 1-dimensional numpy array containg [x, y]
+        # Replaces the whole screen with a single point
+        self.begin_frame()
         # draw.ellipse((x - 1, y - 1, x + 1, y + 1), fill=255*brightness) # Can scale down brightness from 0-1
-        draw.point((x,y), fill=255*brightness) # CHANGED HERE TO POINT INSTEAD OF ELLIPSE FOR HIGHER RES
+        self.draw_point(coords[0], coords[1], brightness) # CHANGED HERE TO POINT INSTEAD OF ELLIPSE FOR HIGHER RES
+        self.commit()
+
+    def clear(self):
+        self.begin_frame()
+        if not self.retained:
+            self.commit()
+            return
+        # Only the pages that still have something lit get sent
+        self.flush()
+
+    def flush(self):
+        """Sends the parts of the framebuffer that differ from what is on the panel."""
+        pages = self.buffer.pages
+
+        if self._sent is None:
+            self._write(0, pages.shape[0] - 1, 0, pages.shape[1] - 1, pages)
+        else:
+            changed = pages != self._sent
+            dirty = np.flatnonzero(np.any(changed, axis=1))
+            if len(dirty):
+                # Changed column range of each dirty page
+                spans = [(page, *np.flatnonzero(changed[page])[[0, -1]]) for page in dirty]
+                separate = sum(end - start + 1 for _, start, end in spans) + WRITE_OVERHEAD * len(spans)
+                col_start = min(start for _, start, _ in spans)
+                col_end = max(end for _, _, end in spans)
+                bulk = (dirty[-1] - dirty[0] + 1) * (col_end - col_start + 1) + WRITE_OVERHEAD
+                if bulk <= separate:
+                    # One window over every change, sent as a single data transfer
+                    self._write(dirty[0], dirty[-1], col_start, col_end, pages[dirty[0]:dirty[-1] + 1])
+                else:
+                    for page, start, end in spans:
+                        self._write(page, page, start, end, pages[page:page + 1])
+
+        self._sent = pages.copy()
+
+    def _write(self, page_start, page_end, col_start, col_end, pages):
+        self.device.command(SET_COLUMN_ADDR, col_start, col_end, SET_PAGE_ADDR, page_start, page_end)
+        data = pages[:, col_start:col_end + 1].tobytes()
+        self.device.data(bytearray(data))
+        self.bytes_sent += len(data)
+
+
+def pack_pages(image):
+    """
+    Packs a 1-bit PIL image into SSD1309 page format.
+
+    Returns:
+        np.ndarray: (height // 8, width) uint8, one byte per column per 8-row page with the
+        top row of the page in bit 0.
+    """
+    pixels = np.asarray(image, dtype=bool)
+    height, width = pixels.shape
+    pages = np.packbits(pixels.reshape(height // 8, 8, width), axis=1, bitorder="little")
+    return pages.reshape(height // 8, width)
+
+
+def unpack_pages(pages):
+    """Inverse of pack_pages: (height // 8, width) page bytes -> (height, width) bool pixels."""
+    n_pages, width = pages.shape
+    bits = np.unpackbits(pages.reshape(n_pages, 1, width), axis=1, bitorder="little")
+    return bits.reshape(n_pages * 8, width).astype(bool)
+
+
+class FakeSSD1309:
+    """
+    In-memory stand-in for luma's ssd1309 device, for running the overlay without hardware.
+
+    It emulates the controller's page RAM in horizontal addressing mode, so the panel
+    contents can be checked after partial page writes.
+
+    Args:
+        width, height (int): Panel size in pixels.
+        bus_hz (int): If set, every command/data write sleeps as long as it would take on an
+            I2C bus at this clock (9 clocks per byte plus a control byte), so the display
+            stage costs about what it does on the Pi. None means no delay.
+    """
+
+    mode = "1"
+
+    def __init__(self, width=128, height=64, bus_hz=None):
+        self.width = width
+        self.height = height
+        self.size = (width, height)
+        self.bus_hz = bus_hz
 
-        self.device.display(image)
+        self.ram = np.zeros((height // 8, width), dtype=np.uint8)
+        self.bytes_written = 0
+        self._columns = (0, width - 1)
+        self._pages = (0, height // 8 - 1)
+        self._column = 0
+        self._page = 0
+
+    def preprocess(self, image):
+        return image # no rotation
+
+    def command(self, *cmd):
+        i = 0
+        while i < len(cmd):
+            if cmd[i] == SET_COLUMN_ADDR:
+                self._columns = (cmd[i + 1], cmd[i + 2])
+                i += 3
+            elif cmd[i] == SET_PAGE_ADDR:
+                self._pages = (cmd[i + 1], cmd[i + 2])
+                i += 3
+            else:
+                i += 1 # everything else (contrast, display on/off, ...) has no effect on the RAM
+        self._column, self._page = self._columns[0], self._pages[0]
+        self._transfer(len(cmd))
+
+    def data(self, data):
+        # Horizontal addressing: fill the column window, then wrap to the next page
+        for byte in data:
+            self.ram[self._page, self._column] = byte
+            self._column += 1
+            if self._column > self._columns[1]:
+                self._column = self._columns[0]
+                self._page = self._page + 1 if self._page < self._pages[1] else self._pages[0]
+        self.bytes_written += len(data)
+        self._transfer(len(data))
+
+    def display(self, image):
+        self.command(SET_COLUMN_ADDR, 0, self.width - 1, SET_PAGE_ADDR, 0, self.height // 8 - 1)
+        self.data(pack_pages(image).tobytes())
 
     def clear(self):
-        self.device.clear()
-    
+        self.display(Image.new("1", self.size))
+
+    def pixels(self):
+        """(height, width) bool array of what the panel is showing."""
+        return unpack_pages(self.ram)
+
+    def _transfer(self, n_bytes):
+        if self.bus_hz:
+            time.sleep((n_bytes + 1) * 9 / self.bus_hz)
+
+
+class RecordingDisplay(TransparentDisplay):
+    """
+    TransparentDisplay on a FakeSSD1309 that records the last committed frames.
+
+    frames holds (time.perf_counter(), page bytes) pairs - unpack_pages() turns the page
+    bytes back into pixels. committed counts every frame, recorded or not.
+
+    Args:
+        max_frames (int): Most recent frames to keep (1 KB each), None for all of them -
+            only for short runs, a looped replay would fill the memory - and 0 for none.
+    """
+
+    def __init__(self, retained=True, bus_hz=None, max_frames=None):
+        super().__init__(retained=retained, device=FakeSSD1309(bus_hz=bus_hz))
+        self.frames = collections.deque(maxlen=max_frames)
+        self.committed = 0
+
+    def commit(self):
+        super().commit()
+        self.committed += 1
+        if self.frames.maxlen != 0:
+            self.frames.append((time.perf_counter(), self.device.ram.copy()))
+
 
 
 def undistort(frame, map1, map2, flip_180=True):
@@ -105,4 +398,140 @@ def intersect_display(plane_center, plane_width, plane_height, resolution, vecto
     x_pix = int((1.0-x_norm) * w_px)
     y_pix = int((1 - y_norm) * h_px)  # Flip Y for screen coordinates
 
-    return x_pix, y_pix
\ No newline at end of file
+    return x_pix, y_pix
+
+
+class DisplayPlane:
+    """
+    Batched version of intersect_display for one fixed display geometry.
+
+    The plane normal and the (u, v, n) basis only depend on the geometry, so they are
+    built once here instead of on every call.
+
+    Args:
+        plane_center (np.ndarray): 3D point, center of the plane (display).
+        plane_width (float): Width of the plane in world units.
+        plane_height (float): Height of the plane in world units.
+        resolution (tuple): (width_px, height_px) resolution of the display.
+    """
+
+    def __init__(self, plane_center, plane_width, plane_height, resolution):
+        self.plane_center = np.asarray(plane_center, dtype=np.float64)
+        self.plane_width = plane_width
+        self.plane_height = plane_height
+        self.resolution = resolution
+
+        # Same plane and basis as intersect_display
+        n = self.plane_center / np.linalg.norm(self.plane_center) # Assume plane faces origin
+        up = np.array([0, 1, 0]) if np.abs(n[1]) < 0.9 else np.array([1, 0, 0])
+        u = np.cross(up, n)
+        u = u / np.linalg.norm(u)
+        v = np.cross(n, u)
+
+        self.normal = n
+        self.basis = np.stack([u, v], axis=1) # (3, 2): projects a point onto (u, v)
+        self.plane_distance = np.dot(n, self.plane_center)
+        self.center_uv = self.plane_center @ self.basis
+
+    def intersect(self, vectors):
+        """
+        Args:
+            vectors (np.ndarray): (N, 3) direction vectors from the origin.
+
+        Returns:
+            (np.ndarray, np.ndarray): (N, 2) int pixel coordinates (x, y) and an (N,) bool
+            mask that is False wherever intersect_display would have returned None. Pixels
+            for invalid rows are left as 0.
+        """
+        vectors = np.asarray(vectors, dtype=np.float64).reshape(-1, 3)
+
+        # Ray-plane intersection for every vector at once
+        denom = vectors @ self.normal
+        valid = np.abs(denom) >= 1e-6 # parallel to the plane
+        t = np.divide(self.plane_distance, denom, out=np.zeros_like(denom), where=valid)
+        valid &= t > 0 # behind the origin
+
+        # Local plane coordinates: (t * vector - center) . (u, v)
+        local = t[:, None] * (vectors @ self.basis) - self.center_uv
+        half_size = np.array([self.plane_width / 2, self.plane_height / 2])
+        valid &= np.all(np.abs(local) <= half_size, axis=1) # outside bounds of the display
+
+        # Map to pixel coordinates, flipping both axes the same way intersect_display does
+        norm = (local + half_size) / (2 * half_size)
+        pixels = np.floor((1.0 - norm) * np.asarray(self.resolution)).astype(np.int64)
+        pixels[~valid] = 0
+
+        return pixels, valid
+
+class DisplayProjection:
+    """
+    from_observer() + DisplayPlane.intersect() folded into one 3x4 projective matrix.
+
+    A ray from the observer through a point hits the plane at a position that is a
+    projective function of the point, and the pixel mapping after it is affine, so for fixed
+    geometry the whole chain is pixel = floor(P[:2] @ p / P[2] @ p) with p = (x, y, z, 1)
+    in front-camera coordinates. Check it with verify_projection().
+
+    Args:
+        plane (DisplayPlane): The display geometry (relative to the observer).
+        observer_offset (np.ndarray): Observer position in front-camera coordinates
+            (OBSERVER_FROM_FF in overlay.py).
+    """
+
+    def __init__(self, plane, observer_offset):
+        self.plane = plane
+        self.observer_offset = np.asarray(observer_offset, dtype=np.float64)
+
+        # pixel = resolution/2 + scale * (center_uv - t * (q . basis)) with t = d / (n . q),
+        # multiplied through by w = n . q. Then q = p - observer_offset.
+        resolution = np.asarray(plane.resolution, dtype=np.float64)
+        scale = resolution / np.array([plane.plane_width, plane.plane_height])
+        rows = (resolution / 2 + scale * plane.center_uv)[:, None] * plane.normal - (scale * plane.plane_distance)[:, None] * plane.basis.T
+        linear = np.vstack([rows, plane.normal]) # (3, 3) acting on q
+        self.matrix = np.hstack([linear, -(linear @ self.observer_offset)[:, None]])
+
+    def project(self, points):
+        """
+        Args:
+            points (np.ndarray): (N, 3) marker positions in front-camera coordinates.
+
+        Returns:
+            (np.ndarray, np.ndarray): Same as DisplayPlane.intersect().
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        projected = points @ self.matrix[:, :3].T + self.matrix[:, 3]
+        w = projected[:, 2]
+        valid = w >= 1e-6 # in front of the observer and not parallel to the display
+        xy = projected[:, :2] / np.where(valid, w, 1.0)[:, None]
+        valid &= np.all((xy >= 0) & (xy <= self.plane.resolution), axis=1) # on the display
+        pixels = np.floor(xy).astype(np.int64)
+        pixels[~valid] = 0
+        return pixels, valid
+
+
+def verify_projection(projection, samples=2000, margin=0.2, depths=(0.05, 5.0), seed=0):
+    """
+    Compares DisplayProjection.project() with intersect_display() for points spread over
+    the display's field of view (plus margin on each side) at random depths.
+
+    Returns:
+        int: How many points gave a different pixel or validity. Anything but a handful
+        right on pixel or display edges (float rounding) means the matrix is wrong.
+    """
+    plane = projection.plane
+    rng = np.random.default_rng(seed)
+
+    # Points on (and a bit around) the display, pushed out along the observer's ray
+    uv = rng.uniform(-0.5 - margin, 0.5 + margin, (samples, 2)) * [plane.plane_width, plane.plane_height]
+    on_plane = plane.plane_center + uv @ plane.basis.T
+    depth = rng.uniform(*depths, samples) / np.linalg.norm(on_plane, axis=1)
+    points = on_plane * depth[:, None] + projection.observer_offset
+
+    pixels, valid = projection.project(points)
+    mismatches = 0
+    for point, pixel, ok in zip(points, pixels, valid):
+        expected = intersect_display(plane.plane_center, plane.plane_width, plane.plane_height, plane.resolution,
+                                     from_observer(point, projection.observer_offset))
+        if (expected is None) == ok or (ok and tuple(pixel) != expected):
+            mismatches += 1
+    return mismatches
@@ -2,109 +2,490 @@
 # 2. Find the 3D coordinates of the center of the arUco code relative to the observer camera.
 # 3. Find the point of intersection between display and this vector.
 # 4. Draw a pixel at the point of intersection.
-from picamera2 import Picamera2
+#
+# Run on the Pi:             python overlay.py
+# Replay without hardware:   python overlay.py --replay recordings/run1 --headless
+# Shared camera:             python capture_server.py --camera 0 & python overlay.py --ring overlay-cam0
+import argparse
+import functools
 import cv2
 import numpy as np
 import time
 import hardware
 import subprocess
 import threading
+import pipeline
+import poses
+import rectify
+import detector
+import filters
+import governor
+import sources
+import telemetry
+import workers
 
 # ADJUSTMENTS - all in meters
-CALIB_YAML    = "calibration/camera_calibration.yaml"  
+CALIB_YAML    = "calibration/camera_calibration.yaml"
 MARKER_LENGTH = 0.1               # marker side length in meters
+MARKER_LAYOUTS = None # JSON file of rigid marker layouts (see marker_layouts.example.json) - each layout becomes one overlay point
 OBSERVER_FROM_FF = np.array([0.0383,0,0.0436]) # this is the observer camera from the front-facing in meters
 DISPLAY_FROM_OBSERVER = np.array([-0.005,0,0.0383]) # how far the center of the display is from the camera
 SCREEN_ACTIVE_AREA = np.array([0.04204, 0.02722]) # how large the screen size is
 DISPLAY_RESOLUTION = (128,56) # transparent pixels of the screen (some are cut off - true size is 64 pixels vertically)
+PRECOMPUTED_PROJECTION = True # project markers with one 3x4 matrix built from the geometry above (checked against intersect_display at startup)
+FRAME_SIZE = (640, 480) # camera resolution the calibration was made at
+CAMERA_NUM = 0 # front-facing camera - its ISP size/format/crop/flip live in sources.CAMERA_SETTINGS
+OBSERVER_CAMERA_NUM = None # set to 1 to also capture the observer camera, paired with the front one by sensor timestamp
+PAIR_TOLERANCE = 0.008 # seconds two frames' sensor timestamps may differ and still count as a pair
+PAIR_MAX_PENDING = 1 # frames per camera waiting for a partner - with ZERO_COPY each camera gets this + 3 buffers
+ZERO_COPY = True # work on the camera's own buffer instead of a copy, released right after preprocessing
+RECTIFY = True # undistort frames before detection
+RECTIFY_ALPHA = 1.0 # 0 = crop to valid pixels only, 1 = keep the whole field of view
+DETECTOR_PROFILE = "balanced" # detector.PROFILES: "fast", "balanced" or "accurate" (compare them with benchmarks/profiles.py)
+DETECT_SCALE = 1.0 # search for markers at this scale, then refine corners at full res (e.g. 0.5 for 1280x720 - needs a calibration made at that size)
+TRACK_MARKERS = True # only search around last known markers between full-frame scans
+DETECT_WORKERS = 0 # detector processes (e.g. 3 for the Pi 5's spare cores, no marker tracking then), 0 = detect on a pipeline thread
+FULL_SCAN_INTERVAL = 15 # frames between full-frame scans while tracking (new markers show up on these)
+DETECT_RATE = 15.0 # detections per second, the frames in between are skipped (0 = every camera frame)
+ADAPTIVE_EFFORT = True # let governor.py turn detection effort down while nothing moves or the CPU can't keep up
+EFFORT_LEVELS = [ # most effort first: (detections per second, detection scale, adaptive threshold windows (min, max, step) in pixels or None for the profile's)
+    (DETECT_RATE, DETECT_SCALE, None),
+    (10.0, DETECT_SCALE, None),
+    (10.0, DETECT_SCALE, (7, 17, 10)),
+    (5.0, DETECT_SCALE, (13, 13, 10)),
+    (5.0, DETECT_SCALE * 0.5, (7, 7, 10)),
+]
+LATENCY_BUDGET = 0.06 # seconds from exposure to filtered pose the governor keeps detections within
+MOTION_DISTANCE = 0.01 # meters a marker has to move (and stand out from pose noise) to bring full effort back
+STATIC_HOLD = 2.0 # seconds of stillness before each step down in effort
+DISPLAY_RATE = 60.0 # display refreshes per second, each drawn from the filtered poses predicted to that moment
+FILTER_PROCESS_NOISE = 0.05 # how quickly the marker filter follows changes in velocity (higher = less smoothing)
+FILTER_MEASUREMENT_NOISE = (4e-6, 4e-6, 1e-4) # variance of a raw marker position in m^2 (x, y, z - depth is the noisiest)
+MARKER_TIMEOUT = 0.5 # seconds a marker stays on the display after its last detection
+MAX_PREDICTION = 0.15 # never extrapolate a marker further than this past the frame it was seen in (seconds)
+PANEL_LATENCY = 0.0 # extra seconds between the end of the I2C transfer and the pixels lighting up
+REPORT_INTERVAL = 5.0 # seconds between stats summaries (only printed with --stats)
+STATS_WINDOW = 500 # frames the latency percentiles are taken over
+SAVE_DISPLAY_FRAMES = 36000 # most recent display frames --save-display keeps (10 min at 60/s, about 37 MB)
+I2C_BUS_HZ = 400000 # clock of the display's I2C bus, used to give the fake display realistic timings
 # ----------------------------------------------
 
-# Load camera calibration from YAML
-fs = cv2.FileStorage(CALIB_YAML, cv2.FILE_STORAGE_READ)
-if not fs.isOpened():
-    raise IOError(f"OverlayPT: Cannot open calibration file: {CALIB_YAML}")
-camera_matrix = fs.getNode("camera_matrix").mat()
-dist_coeffs   = fs.getNode("distortion_coefficients").mat()
-fs.release()
 
-# Initialise Picamera2
-picam2 = Picamera2()
-picam2.preview_configuration.main.size   = (640, 480)
-picam2.preview_configuration.main.format = "RGB888"
-picam2.configure("preview")
-picam2.start()
-time.sleep(1)
+class OverlayPipeline:
+    """
+    capture thread -> detection worker -> display writer (see pipeline.py).
 
-# Initialise the display
-display = hardware.TransparentDisplay()
+    Args:
+        camera: A camera source from sources.py (real camera or a replay).
+        display (hardware.TransparentDisplay): The real display or a RecordingDisplay.
+        show_preview (bool): Show the detection input in an OpenCV window.
+        print_stats (bool): Print throughput and latency percentiles every REPORT_INTERVAL.
+        stats_port (int): Also serve the stats as JSON on this localhost port, or None.
+    """
 
-# Prepare ArUco detector
-aruco_dict = cv2.aruco.Dictionary_get(cv2.aruco.DICT_6X6_250)
-params     = cv2.aruco.DetectorParameters_create()
+    def __init__(self, camera, display, show_preview=True, print_stats=False, stats_port=None):
+        self.camera = camera
+        self.display = display
+        self.show_preview = show_preview
+        self.print_stats = print_stats
 
-# proc = subprocess.Popen(["rpicam-hello", "--camera", "1", "--vflip", "--timeout", "0"])
-print("OverlayPT: Camera thread")
+        # Per-stage latency, from the sensor timestamp to the end of the I2C flush
+        self.telemetry = telemetry.Telemetry(window=STATS_WINDOW)
+        self.stats_server = None
+        if stats_port is not None:
+            self.stats_server = telemetry.StatsServer(self.telemetry, stats_port,
+                                                      extra=lambda: {"throughput": self.report(reset=False)})
 
-print("Press 'q' to quit...")
+        # Load camera calibration from YAML
+        self.camera_matrix, self.dist_coeffs = rectify.load_calibration(CALIB_YAML)
 
+        # Undistort maps are cached next to the YAML and only rebuilt when it (or the size/alpha/view) changes
+        # Unless the camera's ISP already flips the image, the 180° flip is folded into the maps,
+        # so preprocessing is at most one gray conversion + one remap
+        size, flip_180, view = camera.output_size, not camera.flipped, camera.view
+        if RECTIFY:
+            map1, map2, self.pose_matrix = rectify.undistort_maps(CALIB_YAML, size, RECTIFY_ALPHA, flip_180=flip_180, view=view)
+            self.pose_dist = np.zeros(5) # rectified frames have no distortion left
+            self.preprocess = rectify.Preprocessor(size, map1, map2)
+        else:
+            self.pose_matrix = self.camera_matrix if view is None else view @ self.camera_matrix
+            self.pose_dist = self.dist_coeffs
+            self.preprocess = rectify.Preprocessor(size, flip_180=flip_180)
 
+        self.display_plane = hardware.DisplayPlane(DISPLAY_FROM_OBSERVER, SCREEN_ACTIVE_AREA[0], SCREEN_ACTIVE_AREA[1], DISPLAY_RESOLUTION) # plane basis is built once here
+        self.projection = None
+        if PRECOMPUTED_PROJECTION:
+            self.projection = hardware.DisplayProjection(self.display_plane, OBSERVER_FROM_FF)
+            mismatches = hardware.verify_projection(self.projection)
+            if mismatches > 2: # a couple of float ties on pixel edges are fine
+                print(f"OverlayPT: Precomputed projection differs from intersect_display for {mismatches} points, not using it")
+                self.projection = None
 
+        # Detections update a per-marker constant-velocity filter, the display draws predictions from it
+        self.pose_filter = filters.PoseFilter(FILTER_PROCESS_NOISE, FILTER_MEASUREMENT_NOISE,
+                                              max_age=MARKER_TIMEOUT, max_prediction=MAX_PREDICTION)
+        self.last_detection = float("-inf")
+        self.next_detection = float("-inf") # sensor time the next detection is due at
+        self.frame_interval = 0.0 # latest camera frame period
+        self.last_frame = None
+        self.detect_rate = DETECT_RATE
+        self.next_refresh = 0.0
+        self.flush_latency = 0.0 # running average of projection -> end of flush, how far ahead to predict
+        self.torn_frames = 0 # shared-memory frames overwritten by the writer while we read them
 
-while True:
-    # Capture & preprocess
-    frame = picam2.capture_array()
-    frame = cv2.rotate(frame, cv2.ROTATE_180)
-    gray  = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+        # Prepare ArUco detector - in this process, or in a pool of worker processes
+        self.pool = None
+        if DETECT_WORKERS:
+            self.pool = workers.DetectionPool(DETECT_WORKERS, size, make_detector,
+                                              functools.partial(make_pose_engine, self.pose_matrix, self.pose_dist),
+                                              configure_detector)
+        else:
+            self.search_detector = self.marker_detector = make_detector()
+            self.pose_engine = make_pose_engine(self.pose_matrix, self.pose_dist)
+            if TRACK_MARKERS:
+                self.marker_detector = detector.TrackingDetector(self.marker_detector, full_scan_interval=FULL_SCAN_INTERVAL)
 
-    # clear the display
-    display.clear()
+        # Detection effort follows latency and marker motion
+        self.governor = None
+        self.detector_settings = None # for configure_detector(), sent to the pool's workers with every frame
+        self.last_keys = set()
+        if ADAPTIVE_EFFORT:
+            levels = [governor.EffortLevel(*level) for level in EFFORT_LEVELS]
+            self.governor = governor.Governor(levels, LATENCY_BUDGET, STATIC_HOLD)
+            self._apply_effort(self.governor.settings)
 
-    # Detect markers
-    corners, ids, _ = cv2.aruco.detectMarkers(gray, aruco_dict, parameters=params)
+        # Bounded latest-frame-wins hand-offs between the stages
+        self.frame_queue   = pipeline.LatestQueue(maxsize=1, on_drop=lambda item: item[0].release()) # skipped frames go back to the camera
+        self.pose_queue    = pipeline.LatestQueue(maxsize=1) # timings of new detections, for telemetry
+        self.preview_queue = pipeline.LatestQueue(maxsize=1)
+
+        self.stop_event = threading.Event()
+        capture_stage = pipeline.Stage("capture", self.capture, outbox=self.frame_queue, stop_event=self.stop_event)
+        if self.pool is None:
+            self.detect_stage = pipeline.Stage("detect", self.detect, inbox=self.frame_queue, outbox=self.pose_queue,
+                                               stop_event=self.stop_event, upstream=capture_stage)
+            detect_stages = [self.detect_stage]
+        else:
+            # dispatch fills the pool's shared-memory slots, detect collects the results in frame order
+            self.dispatch_stage = pipeline.Stage("dispatch", self.dispatch, inbox=self.frame_queue,
+                                                 stop_event=self.stop_event, upstream=capture_stage)
+            self.detect_stage = pipeline.Stage("detect", self.collect, outbox=self.pose_queue, stop_event=self.stop_event)
+            detect_stages = [self.dispatch_stage, self.detect_stage]
+        display_stage = pipeline.Stage("display", self.render, stop_event=self.stop_event) # paced by DISPLAY_RATE, not by detections
+        self.stages = [capture_stage, *detect_stages, display_stage]
+
+    # PIPELINE STAGES - each one runs in its own thread
+    def capture(self):
+        # Only grab the frame here so the camera is never held up by detection or the display
+        frame = self.camera.read()
+        timing = telemetry.FrameTiming(frame.timestamp)
+        timing.mark("received")
+        if isinstance(frame, sources.FramePair):
+            self.telemetry.record_value("pair_skew", abs(frame.skew))
+        return frame, timing
+
+    def detect(self, item):
+        frame, timing = item
+        if not self._detection_due(timing):
+            frame.release()
+            return None
+        self._detection_started(timing)
+        timing.mark("detect_start")
+
+        # Preprocess - upright (and rectified) gray image in a reused buffer. The remap/flip
+        # reads the camera buffer directly, so it can go back to the camera straight after.
+        # Only if the ISP already did all the work is the camera buffer used as it is.
+        # With an observer camera, frame.observer.image is the matching observer view and
+        # releasing the frame hands both buffers back.
+        # Frames shared through a ring (--ring) can be overwritten while they are read, so
+        # they're checked once they have been read for the last time.
+        gray = self.preprocess(frame.image)
+        if gray is not frame.image:
+            intact = frame.intact()
+            frame.release()
+            if not intact:
+                self.torn_frames += 1
+                return None
+        try:
+            return self._locate(gray, timing, frame if gray is frame.image else None)
+        finally:
+            frame.release()
+
+    def _locate(self, gray, timing, frame=None):
+        # Markers in the upright gray image -> pose filter
+        corners, ids = self.marker_detector.detect(gray)
+        if frame is not None and not frame.intact(): # gray is the shared frame itself
+            self.torn_frames += 1
+            return None
+        timing.mark("detected")
 
-    if ids is not None:
         # cv2.aruco.drawDetectedMarkers(frame, corners, ids)
 
-        # Estimate pose
-        rvecs, tvecs, _ = cv2.aruco.estimatePoseSingleMarkers(
-            corners, MARKER_LENGTH, camera_matrix, dist_coeffs
-        )
+        # Estimate pose - one position per layout, or per marker that isn't in one
+        keys, positions = self.pose_engine.estimate(corners, ids)
+        self.pose_filter.update(keys, positions, timing.marks["sensor"])
+        timing.mark("posed")
+        self._govern(keys, timing)
+
+        if self.show_preview:
+            self.preview_queue.put(gray.copy()) # the preprocess buffer is overwritten by the next frame
+        return timing
+
+    def dispatch(self, item):
+        # Pool mode: preprocess straight into a shared-memory slot and hand it to a worker
+        frame, timing = item
+        slot = self.pool.acquire() if self._detection_due(timing) else None
+        if slot is None:
+            frame.release() # not due, or every worker is busy - skip it like a full queue would
+            return None
+        self._detection_started(timing) # only now, a frame skipped for want of a slot doesn't count
+        timing.mark("detect_start")
+
+        gray = self.preprocess(frame.image, out=self.pool.frames[slot])
+        intact = frame.intact()
+        frame.release()
+        if not intact: # overwritten in the ring while it was copied
+            self.torn_frames += 1
+            self.pool.release(slot)
+            return None
+        if self.show_preview:
+            self.preview_queue.put(gray.copy()) # the slot is reused once the worker is done
+        self.pool.submit(slot, timing, self.detector_settings)
+
+    def collect(self):
+        # Pool mode: results come back in frame order, whichever worker finishes first
+        while True:
+            results = self.pool.results(timeout=pipeline.Stage.POLL_INTERVAL)
+            if results:
+                break
+            if self.stop_event.is_set() or (self.dispatch_stage.finished and self.pool.pending == 0):
+                raise pipeline.EndOfStream
+
+        for timing, keys, positions, marks in results:
+            timing.marks.update(marks) # stamped in the worker, same clock
+            self.pose_filter.update(keys, positions, timing.marks["sensor"])
+            self._govern(keys, timing)
+            self.pose_queue.put(timing)
+
+    def _detection_due(self, timing):
+        # Only detect at the current rate - the filter carries the markers in between
+        # (the caller moves the deadline on once it actually detects). Frames only come every
+        # camera period, so one within half a period of the deadline counts - otherwise a
+        # camera a hair faster than twice the rate would only get a third of it.
+        sensor = timing.marks["sensor"]
+        if self.last_frame is not None:
+            self.frame_interval = max(sensor - self.last_frame, 0.0)
+        self.last_frame = sensor
+        return not self.detect_rate or sensor >= self.next_detection - self.frame_interval / 2
+
+    def _detection_started(self, timing):
+        sensor = timing.marks["sensor"]
+        self.last_detection = sensor
+        if not self.detect_rate:
+            return
+        # Deadlines go up by whole detection periods, so rates that aren't a divisor of the
+        # camera's come out right on average - unless detection fell behind, then start over
+        period = 1.0 / self.detect_rate
+        if sensor - self.next_detection > self.frame_interval:
+            self.next_detection = sensor + period
+        else:
+            self.next_detection += period
+
+    def _govern(self, keys, timing):
+        if self.governor is None:
+            return
+        keys = set(keys)
+        markers_changed = keys != self.last_keys
+        self.last_keys = keys
+
+        marks = timing.marks
+        level = self.governor.level
+        settings = self.governor.observe(marks["sensor"], marks["posed"] - marks["sensor"], marks["posed"] - marks["detect_start"],
+                                         self.pose_filter.moved(MOTION_DISTANCE), markers_changed)
+        if self.governor.level != level:
+            self._apply_effort(settings)
+
+    def _apply_effort(self, settings):
+        self.detect_rate = settings.detect_rate
+        # Count the new rate from the last detection, not from the old deadline
+        self.next_detection = self.last_detection + 1.0 / self.detect_rate if self.detect_rate else float("-inf")
+        self.detector_settings = (settings.scale, settings.threshold_windows)
+        if self.pool is None: # the workers' detectors live in other processes, dispatch() sends them along
+            configure_detector(self.search_detector, self.detector_settings)
+
+    def render(self):
+        # Refresh at DISPLAY_RATE, or straight away when a new detection comes in
+        timing = self.pose_queue.get(timeout=max(0.0, self.next_refresh - time.perf_counter()))
+        if timing is None and self.detect_stage.finished and len(self.pose_queue) == 0:
+            raise pipeline.EndOfStream
+        self.next_refresh = time.perf_counter() + 1.0 / DISPLAY_RATE
+        if timing is not None:
+            timing.mark("render_start")
+
+        ##### Overlay Code #######
+        # Predict every marker to when this refresh will actually be seen, not to when it was
+        # captured - that covers the capture, detection and queueing time since the sensor
+        # timestamp plus the flush still to come. Then all of them go through the projection
+        # in one NumPy pass.
+        render_time = telemetry.now()
+        _, positions, horizons = self.pose_filter.predict(render_time + self.flush_latency + PANEL_LATENCY)
+        if len(horizons):
+            self.telemetry.record_value("prediction", horizons.max()) # how far ahead the markers were extrapolated
+        if self.projection is not None:
+            hits, valid = self.projection.project(positions) # same pixels as below in one matrix multiply
+        else:
+            arucos_from_observer = hardware.from_observer(positions, OBSERVER_FROM_FF) # (N, 3) - each aruco code's position relative to the observer
+            hits, valid = self.display_plane.intersect(arucos_from_observer) # the pixel that the observer sees for the midpoint of each code from their perspective
+        if timing is not None:
+            timing.mark("projected")
+
+        # Runs on its own thread so the blocking I2C transfer never stalls capture.
+        # Every marker is drawn into one frame and sent in a single (diffed) transfer.
+        self.display.begin_frame()
+        for pixel_x, pixel_y in hits[valid]:
+            self.display.draw_point(128-pixel_x, pixel_y) # Draw the point on the dispaly
+        self.display.commit()
+        self.flush_latency += 0.1 * (telemetry.now() - render_time - self.flush_latency)
+
+        if timing is not None:
+            timing.mark("flushed")
+            self.telemetry.record(timing)
+
+    def report(self, reset=True):
+        return pipeline.throughput_report(self.stages, (self.frame_queue, self.pose_queue), reset=reset)
+
+    def stats(self):
+        report = self.report()
+        if self.governor is not None:
+            report += f" | {self.governor.report()}"
+        if self.torn_frames:
+            report += f" | {self.torn_frames} torn frames dropped"
+        return f"{report}\n{self.telemetry.format_summary()}"
+
+    def run(self, duration=None):
+        """Runs until 'q' is pressed, the camera source ends, or duration seconds have passed."""
+        if self.pool is not None:
+            self.pool.start() # before the camera's and our own threads exist
+        self.camera.start()
+        if self.stats_server is not None:
+            self.stats_server.start()
+        for stage in self.stages:
+            stage.start()
+
+        start = last_report = time.perf_counter()
+        try:
+            while not self.stop_event.is_set() and not self.stages[-1].finished:
+                if duration is not None and time.perf_counter() - start >= duration:
+                    break
+
+                if self.show_preview:
+                    # Show result (OpenCV windows have to stay on the main thread)
+                    frame = self.preview_queue.get(timeout=0.1)
+                    if frame is not None:
+                        cv2.imshow("ArUco 3D Pose", frame)
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        # proc.terminate()
+                        print("OverlayPT: Exiting")
+                        break
+                else:
+                    self.stages[-1].join(timeout=0.1)
+
+                # Each stage reports its own throughput and latency (off by default, printing costs time)
+                if self.print_stats and time.perf_counter() - last_report >= REPORT_INTERVAL:
+                    print(f"OverlayPT: {self.stats()}")
+                    last_report = time.perf_counter()
+        finally:
+            self.stop_event.set()
+            for stage in self.stages:
+                stage.join()
+            self.frame_queue.drain() # hand any frame still waiting back to the camera
+            if self.pool is not None:
+                self.pool.close()
+
+            # Cleanup
+            if self.show_preview:
+                cv2.destroyAllWindows()
+            self.camera.stop()
+            if self.stats_server is not None:
+                self.stats_server.shutdown()
+                self.stats_server.server_close()
+
+        for stage in self.stages:
+            if stage.error is not None:
+                raise stage.error
+
+
+def make_detector():
+    # Module level so DetectionPool workers can build their own copy
+    marker_detector = detector.MarkerDetector(cv2.aruco.DICT_6X6_250, profile=DETECTOR_PROFILE)
+    if DETECT_SCALE != 1.0 or ADAPTIVE_EFFORT: # at scale 1.0 it passes frames straight through, the governor can change it
+        marker_detector = detector.PyramidDetector(marker_detector, scale=DETECT_SCALE)
+    return marker_detector
+
 
-        for i, marker_id in enumerate(ids.flatten()):
-            rvec = rvecs[i][0]
-            tvec = tvecs[i][0]  # (x, y, z) in meters
+def configure_detector(marker_detector, settings):
+    # Module level for the same reason as make_detector() - applies a governor effort level to its detector
+    scale, threshold_windows = settings
+    marker_detector.scale = scale
+    marker_detector.detector.set_threshold_windows(threshold_windows)
 
-            # Draw the 3D axes using drawFrameAxes instead
-            # cv2.drawFrameAxes(frame, camera_matrix, dist_coeffs, rvec, tvec, MARKER_LENGTH * 0.5)
 
-            x, y, z = tvec # Here are our 3D coords
-            corner_pt = tuple(corners[i][0][0].astype(int))
-            # Overlay the 3D coords on screen
-            
-            # text = f"ID {marker_id}: x={x:.3f}, y={y:.3f}, z={z:.3f} m"
-            # cv2.putText(frame, text, (corner_pt[0], corner_pt[1] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+def make_pose_engine(camera_matrix, dist_coeffs):
+    # Module level for the same reason as make_detector()
+    layouts = poses.load_layouts(MARKER_LAYOUTS) if MARKER_LAYOUTS else ()
+    return poses.PoseEngine(MARKER_LENGTH, camera_matrix, dist_coeffs, layouts)
 
-            # Print to console
-            # print(f"Marker {marker_id} → (x,y,z)=({x:.3f},{y:.3f},{z:.3f}) m")
 
-            ##### Overlay Code #######
-            aruco_from_observer = hardware.from_observer(np.array([x,y,z]), OBSERVER_FROM_FF) # this will give us the aruco code's position relative to the observer
-            print(f"OverlayPT: Aruco's position from observer cam: f{aruco_from_observer}")
-            pixel_x, pixel_y = hardware.intersect_display(DISPLAY_FROM_OBSERVER, SCREEN_ACTIVE_AREA[0], SCREEN_ACTIVE_AREA[1], DISPLAY_RESOLUTION, aruco_from_observer) # this gives us the pixel that the observer sees which will be the midpoint of the code from their perspective
-            display.point(np.array([128-pixel_x, pixel_y])) # Draw the point on the dispaly
+def main():
+    parser = argparse.ArgumentParser(description="OverlayPT - draw ArUco markers onto the transparent display")
+    parser.add_argument("--replay", help="video file, image folder or glob to use instead of the camera (uses a fake display)")
+    parser.add_argument("--ring", help="read frames shared by capture_server.py under this name instead of opening the camera")
+    parser.add_argument("--fps", type=float, default=30.0, help="replay frame rate, 0 for as fast as possible")
+    parser.add_argument("--loop", action="store_true", help="loop the replay")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument("--headless", action="store_true", help="no preview window")
+    parser.add_argument("--save-display", help=f"with --replay: save the last {SAVE_DISPLAY_FRAMES} display frames to this .npy file")
+    parser.add_argument("--stats", action="store_true", help="print throughput and latency percentiles every few seconds")
+    parser.add_argument("--stats-port", type=int, help="serve the stats as JSON on this localhost port (e.g. nc localhost 5055)")
+    args = parser.parse_args()
 
+    if args.replay:
+        camera = sources.VideoSource(args.replay, size=FRAME_SIZE, fps=args.fps or None, loop=args.loop, preload=True)
+        # Only keep display frames if they are going to be saved
+        display = hardware.RecordingDisplay(bus_hz=I2C_BUS_HZ, max_frames=SAVE_DISPLAY_FRAMES if args.save_display else 0)
+    elif args.ring:
+        camera = sources.RingSource(args.ring)
+        display = hardware.TransparentDisplay()
+    else:
+        if OBSERVER_CAMERA_NUM is None:
+            camera = sources.PicameraSource.for_camera(CAMERA_NUM, zero_copy=ZERO_COPY, calib_size=FRAME_SIZE)
+        else:
+            # Frames waiting for a partner hold camera buffers too (see sources.PairedSource)
+            buffer_count = PAIR_MAX_PENDING + sources.PairedSource.HELD_DOWNSTREAM + 1
+            camera = sources.PicameraSource.for_camera(CAMERA_NUM, zero_copy=ZERO_COPY, calib_size=FRAME_SIZE, buffer_count=buffer_count)
+            observer = sources.PicameraSource.for_camera(OBSERVER_CAMERA_NUM, zero_copy=ZERO_COPY, buffer_count=buffer_count)
+            camera = sources.PairedSource(camera, observer, tolerance=PAIR_TOLERANCE, max_pending=PAIR_MAX_PENDING)
+        display = hardware.TransparentDisplay()
 
+    # proc = subprocess.Popen(["rpicam-hello", "--camera", "1", "--vflip", "--timeout", "0"])
+    print("OverlayPT: Camera thread")
 
+    if not args.headless:
+        print("Press 'q' to quit...")
 
+    try:
+        overlay = OverlayPipeline(camera, display, show_preview=not args.headless,
+                                  print_stats=args.stats, stats_port=args.stats_port)
+        overlay.run(duration=args.duration)
+    finally:
+        if args.ring:
+            camera.close() # detach from the shared ring
+    print(f"OverlayPT: {overlay.stats()}")
 
+    if args.replay and args.save_display:
+        np.save(args.save_display, np.stack([pages for _, pages in display.frames]))
+        print(f"OverlayPT: Saved the last {len(display.frames)} of {display.committed} display frames to {args.save_display}")
 
-    # Show result
-    cv2.imshow("ArUco 3D Pose", frame)
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        # proc.terminate()
-        print("OverlayPT: Exiting")
-        break
 
-# Cleanup
-cv2.destroyAllWindows()
-picam2.stop()
+if __name__ == "__main__":
+    main()
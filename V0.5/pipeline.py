@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+import collections
+import threading
+import time
+
+# Small threading helpers for running overlay.py as a pipeline:
+#   capture thread -> detection worker -> display writer
+# Each hand-off is a LatestQueue, so a slow stage (e.g. the I2C flush) only ever
+# drops stale frames instead of stalling the stages in front of it.
+
+
+class EndOfStream(Exception):
+    # Raised by a source stage's work() when there are no more items (e.g. end of a replay)
+    pass
+
+
+class LatestQueue:
+    """
+    Bounded queue where the newest item wins.
+
+    When the queue is full, put() throws away the oldest item instead of blocking,
+    so the producer never waits on the consumer.
+
+    Args:
+        maxsize (int): How many items can wait.
+        on_drop (callable): Called with every item that gets thrown away (e.g. to hand a
+            camera buffer back), including the ones left over in drain().
+    """
+
+    def __init__(self, maxsize=1, on_drop=None):
+        self._items = collections.deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.on_drop = on_drop
+        self.dropped = 0 # how many items were overwritten before anyone read them
+
+    def put(self, item):
+        dropped = None
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                dropped = self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+        if dropped is not None and self.on_drop is not None:
+            self.on_drop(dropped)
+
+    def drain(self):
+        """Throws away everything still waiting."""
+        with self._cond:
+            items = list(self._items)
+            self._items.clear()
+        if self.on_drop is not None:
+            for item in items:
+                self.on_drop(item)
+
+    def get(self, timeout=None):
+        """Returns the oldest waiting item, or None if nothing arrived within timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: len(self._items) > 0, timeout):
+                return None
+            return self._items.popleft()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+
+class RateCounter:
+    # Counts events and reports the rate over the time since the last reset.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+        self._count = 0
+        self._since = time.perf_counter()
+
+    def tick(self):
+        with self._lock:
+            self.total += 1
+            self._count += 1
+
+    def rate(self, reset=True):
+        with self._lock:
+            now = time.perf_counter()
+            elapsed = now - self._since
+            rate = self._count / elapsed if elapsed > 0 else 0.0
+            if reset:
+                self._count = 0
+                self._since = now
+            return rate
+
+
+class Stage(threading.Thread):
+    """
+    One pipeline stage running in its own thread.
+
+    Args:
+        name (str): Name used in throughput reports.
+        work (callable): Called as work() for a source stage (no inbox), otherwise
+            work(item) for every item taken from the inbox. Returning None means
+            "nothing to pass on". A source raises EndOfStream when it runs dry.
+        inbox (LatestQueue): Where this stage reads from, or None for a source.
+        outbox (LatestQueue): Where results are put, or None for a sink.
+        stop_event (threading.Event): Shared between stages so one can stop them all.
+        upstream (Stage): The stage feeding the inbox. Once it has finished and the inbox
+            is empty, this stage finishes too, so a replay drains through the pipeline.
+    """
+
+    POLL_INTERVAL = 0.1 # seconds between checks of the stop event while idle
+
+    def __init__(self, name, work, inbox=None, outbox=None, stop_event=None, upstream=None):
+        super().__init__(name=name, daemon=True)
+        self.work = work
+        self.inbox = inbox
+        self.outbox = outbox
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        self.upstream = upstream
+        self.counter = RateCounter()
+        self.busy_time = 0.0 # seconds spent inside work(), for per-stage latency
+        self.finished = False
+        self.error = None
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                if self.inbox is None:
+                    start = time.perf_counter()
+                    try:
+                        result = self.work()
+                    except EndOfStream:
+                        break
+                else:
+                    item = self.inbox.get(timeout=self.POLL_INTERVAL)
+                    if item is None:
+                        if self.upstream is not None and self.upstream.finished and len(self.inbox) == 0:
+                            break
+                        continue
+                    start = time.perf_counter()
+                    result = self.work(item)
+
+                self.busy_time += time.perf_counter() - start
+                self.counter.tick()
+                if result is not None and self.outbox is not None:
+                    self.outbox.put(result)
+        except Exception as e:
+            # Keep the traceback for the main thread and bring the whole pipeline down
+            self.error = e
+            self.stop_event.set()
+        finally:
+            self.finished = True
+
+    def stop(self):
+        self.stop_event.set()
+
+    def mean_latency(self):
+        """Average seconds per work() call since the stage started."""
+        return self.busy_time / self.counter.total if self.counter.total else 0.0
+
+
+def throughput_report(stages, queues=(), reset=True):
+    """One-line summary like 'capture 30.1/s 2.0ms | detect 24.3/s 35.2ms | display 12.0/s 80.1ms (dropped 40)'."""
+    parts = [f"{stage.name} {stage.counter.rate(reset):.1f}/s {stage.mean_latency() * 1000:.1f}ms" for stage in stages]
+    dropped = sum(queue.dropped for queue in queues)
+    return " | ".join(parts) + f" (dropped {dropped})"
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+import json
+import cv2
+import numpy as np
+
+# Marker pose estimation for overlay.py.
+# Markers that are fixed to one rigid object (a board, or several markers stuck to a box)
+# are described by a MarkerLayout. All the detected markers of a layout go into one
+# solvePnP, seeded with the layout's pose from the previous frame, and come out as one
+# position - more points per solve means a steadier pose than any single marker gives.
+# Markers that aren't part of a layout are solved on their own, all in one call.
+
+# estimatePoseSingleMarkers was removed in OpenCV 4.7, solvePnP does the same solve there
+HAS_SINGLE_MARKER_POSE = hasattr(cv2.aruco, "estimatePoseSingleMarkers")
+
+
+class MarkerLayout:
+    """
+    Known positions of a set of markers on one rigid object.
+
+    Args:
+        name (str): Key the layout's position is reported under.
+        corners (dict): {marker id: (4, 3) corner positions in meters, in the layout's own
+            frame}, in ArUco order (top-left, top-right, bottom-right, bottom-left).
+        anchor (tuple): Point in the layout's frame that stands for the whole object on the
+            display. Default: the middle of all its markers.
+    """
+
+    def __init__(self, name, corners, anchor=None):
+        self.name = name
+        self.corners = {int(marker_id): np.asarray(points, dtype=np.float64).reshape(4, 3) for marker_id, points in corners.items()}
+        all_corners = np.concatenate(list(self.corners.values()))
+        self.anchor = np.asarray(anchor, dtype=np.float64) if anchor is not None else all_corners.mean(axis=0)
+        self.planar = np.ptp(all_corners[:, 2]) < 1e-9
+
+    @staticmethod
+    def marker_corners(center, length):
+        """Corners of a marker lying flat in the layout's z = 0 plane, x right and y up."""
+        x, y = center[0], center[1]
+        z = center[2] if len(center) > 2 else 0.0
+        half = length / 2
+        return np.array([[x - half, y + half, z], [x + half, y + half, z],
+                         [x + half, y - half, z], [x - half, y - half, z]])
+
+    @classmethod
+    def from_config(cls, entry):
+        """
+        One layout from the config file: {"name", "marker_length", "markers": {id: [x, y]}}
+        with marker centres in meters, or {id: [[x, y, z] x 4]} for explicit corners.
+        Optional "anchor": [x, y, z].
+        """
+        corners = {}
+        for marker_id, position in entry["markers"].items():
+            position = np.asarray(position, dtype=np.float64)
+            corners[marker_id] = position if position.ndim == 2 else cls.marker_corners(position, entry["marker_length"])
+        return cls(entry["name"], corners, entry.get("anchor"))
+
+
+def load_layouts(path):
+    """Reads a JSON file of {"layouts": [...]} (see MarkerLayout.from_config)."""
+    try:
+        with open(path) as f:
+            config = json.load(f)
+    except OSError:
+        raise IOError(f"OverlayPT: Cannot open marker layout file: {path}")
+    return [MarkerLayout.from_config(entry) for entry in config["layouts"]]
+
+
+class PoseEngine:
+    """
+    Turns detected marker corners into one camera-space position per object.
+
+    Args:
+        marker_length (float): Side length of markers that aren't in a layout, in meters.
+        camera_matrix, dist_coeffs (np.ndarray): Camera intrinsics for the frames.
+        layouts (list): MarkerLayouts. A marker ID may only be in one of them.
+        max_seed_age (int): Reuse a layout's previous pose as the starting point for up to
+            this many calls after it was last seen.
+    """
+
+    def __init__(self, marker_length, camera_matrix, dist_coeffs, layouts=(), max_seed_age=5):
+        self.marker_length = marker_length
+        self.camera_matrix = camera_matrix
+        self.dist_coeffs = dist_coeffs
+        self.layouts = list(layouts)
+        self.max_seed_age = max_seed_age
+
+        self.layout_of = {}
+        for layout in self.layouts:
+            for marker_id in layout.corners:
+                if marker_id in self.layout_of:
+                    raise ValueError(f"OverlayPT: Marker {marker_id} is in more than one layout")
+                self.layout_of[marker_id] = layout
+
+        self._seeds = {} # layout name -> (rvec, tvec, calls since it was solved)
+
+    def estimate(self, corners, ids):
+        """
+        Args:
+            corners, ids: Output of a detector's detect() (ids may be None).
+
+        Returns:
+            (list, np.ndarray): Keys (layout names, or marker IDs for markers on their own)
+            and their (N, 3) positions in camera coordinates.
+        """
+        for name, (rvec, tvec, age) in list(self._seeds.items()):
+            if age >= self.max_seed_age:
+                del self._seeds[name]
+            else:
+                self._seeds[name] = (rvec, tvec, age + 1)
+        if ids is None:
+            return [], np.empty((0, 3))
+
+        # Sort the markers into layouts and loose ones
+        groups = {}
+        loose = []
+        for marker_corners, marker_id in zip(corners, ids.flatten()):
+            layout = self.layout_of.get(int(marker_id))
+            if layout is None:
+                loose.append((int(marker_id), marker_corners))
+            else:
+                groups.setdefault(layout.name, (layout, []))[1].append((int(marker_id), marker_corners))
+
+        keys, positions = [], []
+        for name, (layout, markers) in groups.items():
+            position = self._solve_layout(layout, markers)
+            if position is not None:
+                keys.append(name)
+                positions.append(position)
+
+        if loose:
+            keys += [marker_id for marker_id, _ in loose]
+            positions += self._solve_loose([marker_corners for _, marker_corners in loose])
+
+        return keys, np.array(positions).reshape(-1, 3)
+
+    def _solve_loose(self, corners):
+        if HAS_SINGLE_MARKER_POSE:
+            # Every loose marker in one call
+            _, tvecs, _ = cv2.aruco.estimatePoseSingleMarkers(corners, self.marker_length, self.camera_matrix, self.dist_coeffs)
+            return list(tvecs.reshape(-1, 3))
+
+        # Same square-marker solve, one marker at a time
+        object_points = MarkerLayout.marker_corners((0.0, 0.0), self.marker_length)
+        positions = []
+        for marker_corners in corners:
+            _, _, tvec = cv2.solvePnP(object_points, marker_corners.reshape(4, 2).astype(np.float64),
+                                      self.camera_matrix, self.dist_coeffs, flags=cv2.SOLVEPNP_IPPE_SQUARE)
+            positions.append(tvec.ravel())
+        return positions
+
+    def _solve_layout(self, layout, markers):
+        object_points = np.concatenate([layout.corners[marker_id] for marker_id, _ in markers])
+        image_points = np.concatenate([marker_corners.reshape(4, 2) for _, marker_corners in markers]).astype(np.float64)
+
+        seed = self._seeds.get(layout.name)
+        if seed is not None:
+            # Start from last frame's pose - converges in a couple of iterations
+            ok, rvec, tvec = cv2.solvePnP(object_points, image_points, self.camera_matrix, self.dist_coeffs,
+                                          seed[0].copy(), seed[1].copy(), useExtrinsicGuess=True, flags=cv2.SOLVEPNP_ITERATIVE)
+        else:
+            flags = cv2.SOLVEPNP_IPPE if layout.planar else cv2.SOLVEPNP_SQPNP
+            ok, rvec, tvec = cv2.solvePnP(object_points, image_points, self.camera_matrix, self.dist_coeffs, flags=flags)
+        if not ok:
+            return None
+
+        self._seeds[layout.name] = (rvec, tvec, 0)
+        rotation, _ = cv2.Rodrigues(rvec)
+        return rotation @ layout.anchor + tvec.ravel()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+import glob
+import hashlib
+import os
+import cv2
+import numpy as np
+
+# Camera calibration loading and cached undistort/rectify maps.
+# The maps are saved as .npy files next to the calibration YAML, named after a hash of
+# the YAML contents, so they are rebuilt automatically whenever the calibration changes.
+
+CACHE_VERSION = 1 # bump if the way the maps are built changes
+
+
+def load_calibration(path):
+    """
+    Returns:
+        (np.ndarray, np.ndarray): camera_matrix (3, 3) and distortion_coefficients from the YAML.
+    """
+    fs = cv2.FileStorage(path, cv2.FILE_STORAGE_READ)
+    if not fs.isOpened():
+        raise IOError(f"OverlayPT: Cannot open calibration file: {path}")
+    camera_matrix = fs.getNode("camera_matrix").mat()
+    dist_coeffs   = fs.getNode("distortion_coefficients").mat()
+    fs.release()
+    return camera_matrix, dist_coeffs
+
+
+def save_calibration(path, camera_matrix, dist_coeffs, reprojection_error):
+    """Writes a calibration YAML that load_calibration() reads. Replaces it in one go."""
+    stem, ext = os.path.splitext(path)
+    tmp = f"{stem}.tmp{ext}" # FileStorage picks the format from the extension
+    fs = cv2.FileStorage(tmp, cv2.FILE_STORAGE_WRITE)
+    fs.write("camera_matrix", camera_matrix)
+    fs.write("distortion_coefficients", dist_coeffs)
+    fs.write("reprojection_error", reprojection_error)
+    fs.release()
+    os.replace(tmp, path)
+
+
+def _cache_prefix(calib_path):
+    stem, _ = os.path.splitext(calib_path)
+    with open(calib_path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:12]
+    return stem, digest
+
+
+def isp_crop(crop, size):
+    """
+    The part of a ScalerCrop the ISP really scales to an output of size: it keeps the
+    aspect ratio, so it uses the largest centred rectangle of crop with the same shape as size.
+
+    Args:
+        crop (tuple): (x, y, width, height) in sensor pixels.
+        size (tuple): (width, height) of the output.
+    """
+    x, y, w, h = crop
+    if w * size[1] > h * size[0]:
+        fitted = h * size[0] / size[1] # crop is wider - trim the sides
+        return (x + (w - fitted) / 2, y, fitted, h)
+    fitted = w * size[1] / size[0] # crop is taller - trim top and bottom
+    return (x, y + (h - fitted) / 2, w, fitted)
+
+
+def view_transform(calib_size, size, crop=None, full_crop=None):
+    """
+    3x3 matrix taking pixel coordinates in the calibrated image to another view of the same
+    sensor - a different output size and/or a different ISP ScalerCrop. Apply it to the
+    camera matrix (view @ camera_matrix); distortion coefficients stay the same.
+
+    Args:
+        calib_size (tuple): (width, height) the calibration was made at, assumed to be taken
+            without a ScalerCrop - so showing isp_crop(full_crop, calib_size) of the sensor.
+        size (tuple): (width, height) of the new view.
+        crop (tuple): (x, y, width, height) of the sensor the new view shows (after
+            isp_crop()), or None for the same crop as the calibration.
+        full_crop (tuple): The whole sensor area (ScalerCropMaximum).
+
+    Raises:
+        ValueError: Without a crop, if size has a different aspect ratio from calib_size -
+            the ISP would crop differently, and that can't be worked out from the sizes alone.
+    """
+    if crop is None or full_crop is None:
+        if abs(size[0] * calib_size[1] - size[1] * calib_size[0]) > 0.01 * size[0] * calib_size[1]:
+            raise ValueError(f"OverlayPT: A {size[0]}x{size[1]} view has a different aspect ratio from the "
+                             f"{calib_size[0]}x{calib_size[1]} calibration - give its ScalerCrop")
+        return np.diag([size[0] / calib_size[0], size[1] / calib_size[1], 1.0])
+
+    def sensor_to_pixels(view_crop, view_size):
+        x, y, w, h = view_crop
+        sx, sy = view_size[0] / w, view_size[1] / h
+        return np.array([[sx, 0, -x * sx], [0, sy, -y * sy], [0, 0, 1.0]])
+
+    return sensor_to_pixels(crop, size) @ np.linalg.inv(sensor_to_pixels(isp_crop(full_crop, calib_size), calib_size))
+
+
+def undistort_maps(calib_path, size, alpha=1.0, flip_180=False, view=None):
+    """
+    Fixed-point (CV_16SC2) undistort maps for a calibration file, cached on disk.
+
+    Args:
+        calib_path (str): Path to camera_calibration.yaml.
+        size (tuple): (width, height) of the frames the maps are applied to.
+        alpha (float): Free scaling passed to getOptimalNewCameraMatrix
+            (0 = only valid pixels, 1 = keep all source pixels).
+        flip_180 (bool): Fold the 180° rotation of the upside-down camera into the maps, so
+            they take the raw sensor frame and give an upright, rectified one. The calibration
+            stills were captured already flipped, so the intrinsics belong to the upright image.
+        view (np.ndarray): 3x3 view_transform() for frames that are scaled or cropped
+            differently from the calibration images, or None if they match.
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray): map1, map2 for cv2.remap (memory-mapped,
+        read-only) and the new camera matrix that goes with the rectified image.
+        Rectified frames have no distortion left, so pose estimation on them should use
+        this matrix with zero distortion coefficients.
+    """
+    stem, digest = _cache_prefix(calib_path)
+    key = f"{digest}-{size[0]}x{size[1]}-a{alpha:g}{'-r180' if flip_180 else ''}-v{CACHE_VERSION}"
+    if view is not None:
+        key += "-" + hashlib.sha1(np.round(np.asarray(view, dtype=np.float64), 9).tobytes()).hexdigest()[:8]
+    paths = [f"{stem}.{key}.{name}.npy" for name in ("map1", "map2", "newmtx")]
+
+    if not all(os.path.exists(path) for path in paths):
+        camera_matrix, dist_coeffs = load_calibration(calib_path)
+        if view is not None:
+            camera_matrix = view @ camera_matrix
+        new_camera_matrix, _ = cv2.getOptimalNewCameraMatrix(
+            camera_matrix, dist_coeffs, size, alpha, size
+        )
+        if not flip_180:
+            map1, map2 = cv2.initUndistortRectifyMap(
+                camera_matrix, dist_coeffs, None, new_camera_matrix, size, cv2.CV_16SC2
+            )
+        else:
+            # Build float maps, point them at the mirrored source pixel, then convert to fixed-point
+            map_x, map_y = cv2.initUndistortRectifyMap(
+                camera_matrix, dist_coeffs, None, new_camera_matrix, size, cv2.CV_32FC1
+            )
+            map_x = (size[0] - 1) - map_x
+            map_y = (size[1] - 1) - map_y
+            map1, map2 = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+
+        # Maps from an older version of the YAML are useless now
+        for old in glob.glob(f"{glob.escape(stem)}.*.npy"):
+            if not os.path.basename(old).startswith(f"{os.path.basename(stem)}.{digest}-"):
+                os.remove(old)
+
+        for path, array in zip(paths, (map1, map2, new_camera_matrix)):
+            # Write then rename so a half-written file is never picked up as a valid cache
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp, path)
+
+    map1, map2, new_camera_matrix = (np.load(path, mmap_mode="r") for path in paths)
+    return map1, map2, np.array(new_camera_matrix)
+
+
+class Preprocessor:
+    """
+    Raw camera frame -> upright, rectified grayscale in one gray conversion plus one remap.
+
+    Both steps write into buffers allocated once here, so the returned image is reused
+    (overwritten) on the next call. Copy it if it has to outlive the frame.
+
+    Args:
+        size (tuple): (width, height) of the incoming frames.
+        map1, map2 (np.ndarray): Maps from undistort_maps(..., flip_180=True), or None to
+            skip rectification and only do the gray conversion + rotation.
+        flip_180 (bool): Only used without maps - rotate the gray image instead.
+        conversion (int): cv2.cvtColor code for the camera format.
+    """
+
+    def __init__(self, size, map1=None, map2=None, flip_180=True, conversion=cv2.COLOR_RGB2GRAY):
+        self.map1 = map1
+        self.map2 = map2
+        self.flip_180 = flip_180
+        self.conversion = conversion
+
+        width, height = size
+        self.gray = np.empty((height, width), dtype=np.uint8)
+        self.out = np.empty((height, width), dtype=np.uint8)
+
+    def __call__(self, frame, out=None):
+        """
+        Args:
+            frame (np.ndarray): Raw camera frame.
+            out (np.ndarray): Where to write the result (e.g. a shared-memory slot) instead of
+                the internal buffer. Always written to, even when there is nothing to do.
+        """
+        last_step = self.map1 is None and not self.flip_180 # the conversion can write straight to out
+        if frame.ndim == 2:
+            gray = frame # already gray (e.g. a Y plane)
+        else:
+            gray = cv2.cvtColor(frame, self.conversion, dst=out if last_step and out is not None else self.gray)
+
+        # Gray first - remapping one channel is a third of the work of remapping RGB
+        dst = self.out if out is None else out
+        if self.map1 is not None:
+            return cv2.remap(gray, self.map1, self.map2, cv2.INTER_LINEAR, dst=dst)
+        if self.flip_180:
+            return cv2.rotate(gray, cv2.ROTATE_180, dst=dst)
+        if out is not None and gray is not out:
+            np.copyto(out, gray)
+            return out
+        return gray
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+import json
+import os
+import sys
+import time
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+
+# Shared-memory frame ring buffer, so one capture process can feed several consumers
+# (overlay detection, a preview, a recorder) without copying or pickling frames.
+#
+# Layout of the shared block:
+#   [ JSON header | write_seq | slot_seq[slots] | slot_time[slots] | frames[slots] ]
+# The writer fills frames[seq % slots] and then publishes it by storing seq in slot_seq and
+# seq + 1 in write_seq. It never waits for readers. Each reader keeps its own cursor (the
+# next seq it wants) and gets a view straight into the slot - if it holds on to a frame for
+# longer than the ring takes to wrap around, the slot gets overwritten, which
+# RingReader.valid() detects afterwards (like a seqlock).
+
+HEADER_SIZE = 4096 # bytes reserved for the JSON header (shape, dtype, slots, metadata)
+POLL_INTERVAL = 0.001 # seconds between checks for a new frame while a reader waits
+_ALIGN = 64
+
+
+class FrameRing:
+    """
+    Fixed number of preallocated frames in shared memory. Use create() in the process that
+    captures and attach() everywhere else.
+
+    Attributes:
+        frames (np.ndarray): (slots, *shape) view of all the slots.
+        meta (dict): Anything the writer wants readers to know (e.g. whether frames are
+            already upright), JSON-serialisable.
+    """
+
+    def __init__(self, shm, header, owner):
+        self.shm = shm
+        self.owner = owner
+        self.name = shm.name
+        self.shape = tuple(header["shape"])
+        self.dtype = np.dtype(header["dtype"])
+        self.slots = header["slots"]
+        self.meta = header["meta"]
+
+        offset = HEADER_SIZE
+        self._write_seq = np.ndarray((1,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += 8
+        self._slot_seq = np.ndarray((self.slots,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += 8 * self.slots
+        self._slot_time = np.ndarray((self.slots,), dtype=np.float64, buffer=shm.buf, offset=offset)
+        offset += 8 * self.slots
+        offset = -(-offset // _ALIGN) * _ALIGN
+        self.frames = np.ndarray((self.slots, *self.shape), dtype=self.dtype, buffer=shm.buf, offset=offset)
+
+    @classmethod
+    def create(cls, name, shape, dtype=np.uint8, slots=8, meta=None):
+        """
+        Args:
+            name (str): Shared-memory name the readers attach with, e.g. "overlay-cam0".
+            shape (tuple): Shape of one frame, e.g. (480, 640) for a gray image.
+            dtype: Pixel type.
+            slots (int): Frames kept. A reader can fall slots - 1 frames behind before it
+                misses any.
+            meta (dict): Passed on to readers as FrameRing.meta.
+        """
+        dtype = np.dtype(dtype)
+        header = json.dumps({"shape": list(shape), "dtype": dtype.str, "slots": slots, "meta": meta or {},
+                             "pid": os.getpid()}).encode()
+        if len(header) + 4 > HEADER_SIZE:
+            raise ValueError("OverlayPT: Frame ring metadata too large")
+        frame_bytes = int(np.prod(shape)) * dtype.itemsize
+        control = -(-(HEADER_SIZE + 8 + 16 * slots) // _ALIGN) * _ALIGN
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=control + slots * frame_bytes)
+        except FileExistsError:
+            cls._remove_stale(name) # left behind by a writer that crashed
+            shm = shared_memory.SharedMemory(name=name, create=True, size=control + slots * frame_bytes)
+
+        shm.buf[:4] = len(header).to_bytes(4, "little")
+        shm.buf[4:4 + len(header)] = header
+        ring = cls(shm, json.loads(header), owner=True)
+        ring._write_seq[0] = 0
+        ring._slot_seq[:] = -1
+        return ring
+
+    @staticmethod
+    def _remove_stale(name):
+        # Unlinks an existing segment unless the process that created it is still running.
+        # Opening it registers it with our resource tracker, unlink() unregisters it again.
+        old = shared_memory.SharedMemory(name=name)
+        try:
+            length = int.from_bytes(bytes(old.buf[:4]), "little")
+            pid = json.loads(bytes(old.buf[4:4 + length])).get("pid") if 0 < length <= HEADER_SIZE - 4 else None
+        except ValueError:
+            pid = None # not one of ours, or half written
+        finally:
+            old.close()
+        if pid is not None and pid != os.getpid() and _process_alive(pid):
+            resource_tracker.unregister(old._name, "shared_memory") # so our exit doesn't delete it
+            raise FileExistsError(f"OverlayPT: Frame ring '{name}' is already being written by process {pid}")
+        old.unlink()
+        print(f"OverlayPT: Removed stale frame ring '{name}'")
+
+    @classmethod
+    def attach(cls, name):
+        """Opens a ring another process created."""
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            # Otherwise this process's resource tracker deletes the segment when it exits,
+            # taking it away from the writer and every other reader
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, "shared_memory")
+        length = int.from_bytes(bytes(shm.buf[:4]), "little")
+        return cls(shm, json.loads(bytes(shm.buf[4:4 + length])), owner=False)
+
+    # WRITER SIDE
+    def claim(self):
+        """
+        The slot the next frame goes into, to be filled in place (e.g. cv2 dst=, np.copyto)
+        and then published. Readers see it as not available until publish().
+        """
+        seq = int(self._write_seq[0])
+        index = seq % self.slots
+        self._slot_seq[index] = -1
+        return self.frames[index]
+
+    def publish(self, timestamp):
+        seq = int(self._write_seq[0])
+        index = seq % self.slots
+        self._slot_time[index] = timestamp
+        self._slot_seq[index] = seq
+        self._write_seq[0] = seq + 1
+        return seq
+
+    def write(self, image, timestamp):
+        """claim() + copy + publish() for an image that isn't already in the ring."""
+        np.copyto(self.claim(), image)
+        return self.publish(timestamp)
+
+    # READER SIDE
+    @property
+    def head(self):
+        """Sequence number the next published frame will get."""
+        return int(self._write_seq[0])
+
+    def reader(self, latest=True):
+        """A new RingReader, starting at the next frame."""
+        return RingReader(self, latest)
+
+    def close(self):
+        self.frames = self._write_seq = self._slot_seq = self._slot_time = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True # someone else's process
+    return True
+
+
+class RingReader:
+    """
+    One consumer's cursor into a FrameRing.
+
+    Args:
+        ring (FrameRing): The ring to read.
+        latest (bool): Jump straight to the newest frame when behind (detection, preview),
+            instead of taking every frame still in the ring in order (recording).
+    """
+
+    def __init__(self, ring, latest=True):
+        self.ring = ring
+        self.latest = latest
+        self.cursor = ring.head # next seq wanted
+        self.missed = 0 # frames overwritten or skipped before this reader got to them
+
+    def read(self, timeout=None):
+        """
+        Next frame, as (seq, image, timestamp) where image is a view into the ring, or
+        None if nothing new arrived within timeout (None = wait forever).
+        """
+        ring = self.ring
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            head = ring.head
+            if head <= self.cursor:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return None
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            # The oldest frame that isn't about to be overwritten is head - slots + 1
+            seq = head - 1 if self.latest else max(self.cursor, head - ring.slots + 1)
+            self.missed += seq - self.cursor
+            self.cursor = seq + 1
+            index = seq % ring.slots
+            timestamp = float(ring._slot_time[index])
+            if ring._slot_seq[index] == seq:
+                return seq, ring.frames[index], timestamp
+            self.missed += 1 # overwritten while we were looking - take the next one
+
+    def valid(self, seq):
+        """Whether frame seq is still intact - check after using an image from read()."""
+        return self.ring._slot_seq[seq % self.ring.slots] == seq
+
+    @property
+    def lag(self):
+        """Frames published that this reader hasn't read yet."""
+        return self.ring.head - self.cursor
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+import collections
+import contextlib
+import glob
+import os
+import threading
+import time
+import cv2
+import numpy as np
+import pipeline
+import rectify
+import ring
+import telemetry
+
+# Camera sources for overlay.py. They all have start(), read() and stop(), where read()
+# returns a Frame and raises pipeline.EndOfStream when done. Frame images are either in the
+# layout Picamera2's "RGB888" gives (3 channels, BGR order in memory - what OpenCV reads
+# from files too) or a 2D gray image (the Y plane of YUV420).
+
+
+class Frame:
+    """
+    One captured image plus its timestamp (seconds, on the telemetry.now() clock).
+
+    The image may point straight into a camera buffer, so call release() as soon as it
+    is no longer needed - after that the image must not be touched.
+
+    Frames from a RingSource are views into a ring slot the writer may overwrite at any
+    time (it never waits). They carry their sequence number, and intact() tells whether
+    the slot still holds them - check it after reading the image, and drop the frame if not.
+    """
+
+    __slots__ = ("image", "timestamp", "seq", "_release", "_valid")
+
+    def __init__(self, image, timestamp, release=None, seq=None, valid=None):
+        self.image = image
+        self.timestamp = timestamp
+        self.seq = seq
+        self._release = release
+        self._valid = valid # called with seq, False once the image was overwritten
+
+    def release(self):
+        if self._release is not None:
+            self._release()
+            self._release = None
+
+    def intact(self):
+        """Whether the image is still the one that was captured."""
+        return self._valid is None or self._valid(self.seq)
+
+
+class FramePair:
+    """
+    A front and an observer frame captured at (nearly) the same moment, from PairedSource.
+
+    Has the front frame's image and timestamp, so code that only wants the front camera can
+    treat it like a Frame. release() hands both back.
+    """
+
+    __slots__ = ("front", "observer")
+
+    def __init__(self, front, observer):
+        self.front = front
+        self.observer = observer
+
+    @property
+    def image(self):
+        return self.front.image
+
+    @property
+    def timestamp(self):
+        return self.front.timestamp
+
+    @property
+    def skew(self):
+        """Observer minus front sensor timestamp, in seconds."""
+        return self.observer.timestamp - self.front.timestamp
+
+    def release(self):
+        self.front.release()
+        self.observer.release()
+
+    def intact(self):
+        return self.front.intact() and self.observer.intact()
+
+
+# Per-camera ISP setup, same ports as tests/show_cams.py (cam0 = front wide-angle,
+# cam1 = observer). Anything here can be overridden with PicameraSource.for_camera(index, ...).
+CAMERA_SETTINGS = {
+    0: dict(size=(640, 480), format="YUV420", isp_flip_180=True, lores_size=None, scaler_crop=None),
+    1: dict(size=(640, 480), format="YUV420", isp_flip_180=True, lores_size=None, scaler_crop=None),
+}
+
+
+class PicameraSource:
+    """
+    The real camera. picamera2 is only imported here so replays work without it.
+
+    Args:
+        size (tuple): (width, height) of the main stream.
+        format (str): "RGB888", or "YUV420" to get the Y plane as a ready-made gray image.
+        camera_num (int): CSI port, 0 = front (wide-angle) camera, 1 = observer camera.
+        zero_copy (bool): Hand out a view of the mapped request buffer instead of copying it
+            with capture_array(). The camera keeps the buffer until Frame.release().
+        buffer_count (int): Camera buffers - with zero_copy a few are held by the pipeline
+            (one waiting in the queue, one being processed), so keep some spare.
+        isp_flip_180 (bool): Have the camera flip the image (libcamera Transform) so frames
+            arrive upright and nothing has to be rotated on the CPU.
+        lores_size (tuple): Also run the ISP's low-res YUV420 stream at this size and hand out
+            its Y plane instead of the main stream - the ISP does the downscaling.
+        scaler_crop (tuple): (x, y, width, height) of the sensor to use (ScalerCrop), e.g. to
+            zoom in on the middle of the wide-angle view. None for the full view.
+        calib_size (tuple): Size the calibration images were taken at, to work out how the
+            delivered frames relate to them (see view).
+
+    output_size is the size of the delivered images, flipped says whether
+    they are already upright and view is the rectify.view_transform() from the calibration
+    images to them (None if they match). view is worked out from the ScalerCrop the ISP
+    should end up with, and start() checks that against the one it really uses.
+    """
+
+    CROP_TOLERANCE = 0.01 # fraction of the crop size the real ScalerCrop may be off by
+
+    def __init__(self, size=(640, 480), format="RGB888", camera_num=0, zero_copy=False, buffer_count=4,
+                 isp_flip_180=False, lores_size=None, scaler_crop=None, calib_size=(640, 480)):
+        from picamera2 import Picamera2, MappedArray
+        from libcamera import Transform
+
+        self.size = size
+        self.format = format
+        self.zero_copy = zero_copy
+        self.buffer_count = buffer_count
+        self.lores_size = lores_size
+        self.scaler_crop = scaler_crop
+        self.calib_size = calib_size
+        self._mapped_array = MappedArray
+
+        self.stream = "lores" if lores_size is not None else "main"
+        self.output_size = lores_size if lores_size is not None else size
+        self.flipped = isp_flip_180
+        self.view = None
+        self.expected_crop = None
+
+        self.picam2 = Picamera2(camera_num=camera_num)
+        self.config = self.picam2.create_preview_configuration(
+            main={"size": size, "format": format},
+            lores={"size": lores_size, "format": "YUV420"} if lores_size is not None else None,
+            transform=Transform(hflip=1, vflip=1) if isp_flip_180 else Transform(),
+            controls={"ScalerCrop": scaler_crop} if scaler_crop is not None else {},
+            buffer_count=buffer_count,
+        )
+
+        if scaler_crop is not None or tuple(self.output_size) != tuple(calib_size):
+            # The calibration stills are upright (180° from the sensor) and cover the whole
+            # ScalerCropMaximum, so mirror the crop about its centre before comparing
+            full_crop = self.picam2.camera_properties["ScalerCropMaximum"]
+            # The ISP keeps the main stream's aspect ratio and crops whatever doesn't fit
+            self.expected_crop = rectify.isp_crop(scaler_crop if scaler_crop is not None else full_crop, size)
+            x, y, w, h = self.expected_crop
+            fx, fy, fw, fh = full_crop
+            crop = (2 * fx + fw - x - w, 2 * fy + fh - y - h, w, h)
+            self.view = rectify.view_transform(calib_size, self.output_size, crop, full_crop)
+
+    @classmethod
+    def for_camera(cls, camera_num, **overrides):
+        """PicameraSource with CAMERA_SETTINGS[camera_num], updated with any overrides."""
+        settings = dict(CAMERA_SETTINGS[camera_num])
+        settings.update(overrides)
+        return cls(camera_num=camera_num, **settings)
+
+    def start(self):
+        self.picam2.configure(self.config)
+        self.picam2.start()
+
+        time.sleep(1) # camera warm-up
+
+        if self.expected_crop is not None:
+            # view (and the undistort maps built from it) assume this crop - fail loudly if
+            # the ISP chose another one rather than rectify with the wrong intrinsics
+            crop = self.picam2.capture_metadata()["ScalerCrop"]
+            off = max(abs(a - b) for a, b in zip(crop, self.expected_crop))
+            if off > self.CROP_TOLERANCE * max(self.expected_crop[2:]):
+                self.picam2.stop()
+                raise RuntimeError(f"OverlayPT: Camera uses ScalerCrop {tuple(crop)}, expected "
+                                   f"{tuple(round(v) for v in self.expected_crop)} - set scaler_crop in CAMERA_SETTINGS")
+
+    def read(self):
+        # capture_request() instead of capture_array() to get the sensor timestamp with the frame
+        request = self.picam2.capture_request()
+        if not self.zero_copy:
+            try:
+                sensor_time = request.get_metadata()["SensorTimestamp"] / 1e9 # ns since boot
+                image = self._gray_plane(request.make_array(self.stream))
+            finally:
+                request.release()
+            return Frame(image, sensor_time)
+
+        # Map the buffer and keep it (and the request) until the frame is released
+        mapping = contextlib.ExitStack()
+        try:
+            sensor_time = request.get_metadata()["SensorTimestamp"] / 1e9
+            mapped = mapping.enter_context(self._mapped_array(request, self.stream))
+            image = self._gray_plane(mapped.array)
+        except Exception:
+            mapping.close()
+            request.release()
+            raise
+
+        def release():
+            mapping.close()
+            request.release()
+
+        return Frame(image, sensor_time, release)
+
+    def stop(self):
+        self.picam2.stop()
+
+    def _gray_plane(self, array):
+        # YUV420 comes as one (height * 3/2, stride) array - the first height rows are Y
+        if self.stream == "lores" or self.format == "YUV420":
+            width, height = self.output_size
+            return array[:height, :width]
+        return array
+
+
+class VideoSource:
+    """
+    Camera stand-in that plays back a recording.
+
+    Args:
+        path (str): A video file, a folder of images, or a glob like "frames/*.png".
+            Frames should be raw (upside-down) camera frames, e.g. from tests/record_frames.py.
+        size (tuple): Resize frames to this (width, height) if they differ, or None to keep them.
+        fps (float): Play back at this rate like a camera would, or None for as fast as possible.
+        loop (bool): Start again from the first frame instead of ending.
+        preload (bool): Read an image folder into memory first, so disk reads don't show up
+            in the capture timings.
+    """
+
+    def __init__(self, path, size=None, fps=30.0, loop=False, preload=False):
+        self.path = path
+        self.size = size
+        self.fps = fps
+        self.loop = loop
+
+        # Recordings are raw camera frames at the calibration size (see PicameraSource)
+        self.output_size = size
+        self.flipped = False
+        self.view = None
+
+        if os.path.isdir(path):
+            pattern = os.path.join(glob.escape(path), "*")
+        else:
+            pattern = path
+        self.files = sorted(f for f in glob.glob(pattern) if os.path.splitext(f)[1].lower() in (".png", ".jpg", ".jpeg", ".bmp"))
+        self.frames = [self._load(f) for f in self.files] if preload and self.files else None
+        self.capture = None
+        self.index = 0
+        self._next_time = None
+
+    def start(self):
+        if not self.files:
+            self.capture = cv2.VideoCapture(self.path)
+            if not self.capture.isOpened():
+                raise IOError(f"OverlayPT: Cannot open replay source: {self.path}")
+        self.index = 0
+        self._next_time = time.perf_counter()
+
+    def read(self):
+        frame = self._next_frame()
+        if frame is None and self.loop and self.index > 0:
+            self.stop()
+            self.start()
+            frame = self._next_frame()
+        if frame is None:
+            raise pipeline.EndOfStream()
+
+        if self.size is not None and frame.shape[1::-1] != tuple(self.size):
+            frame = cv2.resize(frame, tuple(self.size), interpolation=cv2.INTER_AREA)
+
+        # Hold frames back to the camera's frame rate
+        if self.fps:
+            self._next_time += 1.0 / self.fps
+            delay = self._next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self._next_time = time.perf_counter() # running behind - don't try to catch up
+        return Frame(frame, telemetry.now()) # now() stands in for the sensor timestamp
+
+    def stop(self):
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+
+    def _next_frame(self):
+        if self.capture is not None:
+            ok, frame = self.capture.read()
+            if not ok:
+                return None
+        elif self.index < len(self.files):
+            frame = self.frames[self.index] if self.frames is not None else self._load(self.files[self.index])
+        else:
+            return None
+        self.index += 1
+        return frame
+
+    @staticmethod
+    def _load(path):
+        frame = cv2.imread(path)
+        if frame is None:
+            raise IOError(f"OverlayPT: Cannot read replay frame: {path}")
+        return frame
+
+
+class RingSource:
+    """
+    Frames shared by another process through a ring.FrameRing (see capture_server.py), so
+    several programs can use one camera. Images are views straight into shared memory.
+
+    Args:
+        name (str): Shared-memory name of the ring, e.g. "overlay-cam0".
+        latest (bool): Always take the newest frame (skipping any missed), or every frame
+            in order as long as the ring still has it - see ring.RingReader.
+        timeout (float): Seconds without a new frame before giving up with EndOfStream.
+    """
+
+    def __init__(self, name, latest=True, timeout=2.0):
+        self.ring = ring.FrameRing.attach(name)
+        self.latest = latest
+        self.timeout = timeout
+        self.reader = None
+
+        # The capture process says how its frames relate to the calibration
+        height, width = self.ring.shape[:2]
+        self.output_size = (width, height)
+        self.flipped = self.ring.meta.get("flipped", False)
+        view = self.ring.meta.get("view")
+        self.view = np.array(view) if view is not None else None
+
+    def start(self):
+        self.reader = self.ring.reader(self.latest)
+
+    def read(self):
+        result = self.reader.read(timeout=self.timeout)
+        if result is None:
+            raise pipeline.EndOfStream()
+        seq, image, timestamp = result
+        return Frame(image, timestamp, seq=seq, valid=self.reader.valid)
+
+    def stop(self):
+        pass
+
+    def close(self):
+        self.ring.close()
+
+
+class PairedSource:
+    """
+    Front and observer cameras captured at the same time, delivered as FramePairs.
+
+    Each camera is read on its own thread (capture_request() waits outside the GIL), so
+    both run at their full frame rate. Frames are paired by sensor timestamp - both come
+    from the same boot clock - and a frame whose partner never turns up is dropped.
+
+    Args:
+        front: Source for the front camera (e.g. PicameraSource.for_camera(0)).
+        observer: Source for the observer camera, ideally at the same frame rate.
+        tolerance (float): Largest timestamp difference in seconds that still counts as a pair.
+            Without hardware sync the two sensors drift against each other, so anything up to
+            half a frame time (~16 ms at 30 fps) is as close as it gets.
+        max_pending (int): Frames held per camera while waiting for a partner. With zero_copy
+            every one of them holds a camera buffer, on top of the one waiting in overlay.py's
+            frame queue and the one being preprocessed - and libcamera needs at least one
+            free to keep capturing. So each camera needs buffer_count >= max_pending + 3
+            (PicameraSource's default of 4 fits max_pending=1).
+    """
+
+    HELD_DOWNSTREAM = 2 # zero-copy frames the overlay pipeline holds at once (queued + in preprocessing)
+
+    def __init__(self, front, observer, tolerance=0.008, max_pending=1):
+        for source in (front, observer):
+            needed = max_pending + self.HELD_DOWNSTREAM + 1
+            if getattr(source, "zero_copy", False) and source.buffer_count < needed:
+                raise ValueError(f"OverlayPT: Pairing with max_pending={max_pending} needs buffer_count >= {needed} "
+                                 f"per zero-copy camera, got {source.buffer_count}")
+        self.sources = (front, observer)
+        self.tolerance = tolerance
+        self.max_pending = max_pending
+
+        # Everything downstream works on the front camera
+        self.output_size = front.output_size
+        self.flipped = front.flipped
+        self.view = front.view
+
+        self._cond = threading.Condition()
+        self._pending = (collections.deque(), collections.deque())
+        self._ended = [False, False]
+        self._stop_event = threading.Event()
+        self._threads = []
+        self.error = None
+        self.unpaired = 0 # frames dropped for having no partner
+
+    def start(self):
+        self._stop_event.clear()
+        self._ended = [False, False]
+        for index, (source, name) in enumerate(zip(self.sources, ("front", "observer"))):
+            source.start()
+            thread = threading.Thread(target=self._capture, args=(index,), name=f"capture-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def read(self):
+        with self._cond:
+            while True:
+                if self.error is not None:
+                    raise self.error
+                pair = self._match()
+                if pair is not None:
+                    return pair
+                if any(ended and not pending for ended, pending in zip(self._ended, self._pending)):
+                    raise pipeline.EndOfStream()
+                self._cond.wait(timeout=0.1)
+
+    def stop(self):
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout=1)
+        self._threads = []
+        with self._cond:
+            for pending in self._pending:
+                while pending:
+                    pending.popleft().release()
+        for source in self.sources:
+            source.stop()
+
+    def _capture(self, index):
+        source, pending = self.sources[index], self._pending[index]
+        try:
+            while not self._stop_event.is_set():
+                frame = source.read()
+                with self._cond:
+                    pending.append(frame)
+                    while len(pending) > self.max_pending:
+                        pending.popleft().release() # the reader is behind, keep the newest
+                        self.unpaired += 1
+                    self._cond.notify()
+        except pipeline.EndOfStream:
+            pass
+        except Exception as e:
+            self.error = e
+        finally:
+            with self._cond:
+                self._ended[index] = True
+                self._cond.notify()
+
+    def _match(self):
+        # Both queues are in time order, so compare their oldest frames: either they pair up,
+        # or the older one can't have a partner any more (the other camera is already past it)
+        fronts, observers = self._pending
+        while fronts and observers:
+            skew = observers[0].timestamp - fronts[0].timestamp
+            if abs(skew) <= self.tolerance:
+                return FramePair(fronts.popleft(), observers.popleft())
+            older = fronts if skew > 0 else observers
+            older.popleft().release()
+            self.unpaired += 1
+        return None
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+import collections
+import json
+import socketserver
+import threading
+import time
+import numpy as np
+
+# Low-overhead latency instrumentation for overlay.py.
+# Every frame carries a FrameTiming through the pipeline; each stage just marks the time.
+# Once the frame reaches the display, Telemetry turns the marks into per-stage durations
+# and keeps the last few hundred of each for rolling p50/p95/p99 summaries.
+
+# Picamera2's SensorTimestamp counts from boot, so use the same clock for everything else
+if hasattr(time, "CLOCK_BOOTTIME"):
+    def now():
+        return time.clock_gettime(time.CLOCK_BOOTTIME)
+else:
+    now = time.monotonic
+
+# metric name -> (from mark, to mark)
+METRICS = {
+    "capture":          ("sensor", "received"),      # exposure -> frame in our hands
+    "queue":            ("received", "detect_start"),
+    "detection":        ("detect_start", "detected"), # preprocessing + marker search
+    "pose":             ("detected", "posed"),        # pose estimate + filter update
+    "display_queue":    ("posed", "render_start"),
+    "projection":       ("render_start", "projected"), # filter prediction + display intersection
+    "flush":            ("projected", "flushed"),     # compose + I2C transfer
+    "motion_to_photon": ("sensor", "flushed"),
+}
+
+
+class FrameTiming:
+    """Timestamps (seconds, on the now() clock) for one frame as it moves through the stages."""
+
+    __slots__ = ("marks",)
+
+    def __init__(self, sensor_time=None):
+        self.marks = {"sensor": sensor_time if sensor_time is not None else now()}
+
+    def mark(self, name):
+        self.marks[name] = now()
+
+
+class Telemetry:
+    """
+    Rolling per-stage latency statistics.
+
+    Args:
+        window (int): How many recent frames each percentile is taken over.
+    """
+
+    def __init__(self, window=500):
+        self._lock = threading.Lock()
+        self._samples = {name: collections.deque(maxlen=window) for name in METRICS}
+        self._extra = {} # other values added with record_value(), same treatment
+        self.window = window
+        self.frames = 0
+
+    def record(self, timing):
+        # Called once per frame from the display stage - only appends, no maths
+        marks = timing.marks
+        with self._lock:
+            for name, (start, end) in METRICS.items():
+                if start in marks and end in marks:
+                    self._samples[name].append(marks[end] - marks[start])
+            self.frames += 1
+
+    def record_value(self, name, value):
+        """Adds a sample for a metric that isn't a difference between two marks."""
+        with self._lock:
+            if name not in self._extra:
+                self._extra[name] = collections.deque(maxlen=self.window)
+            self._extra[name].append(value)
+
+    def summary(self):
+        """{metric: {"p50", "p95", "p99", "mean" (all ms), "count"}} over the rolling window."""
+        with self._lock:
+            samples = {name: np.array(values) for name, values in {**self._samples, **self._extra}.items() if values}
+        result = {}
+        for name, values in samples.items():
+            p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+            result[name] = {"p50": p50, "p95": p95, "p99": p99, "mean": values.mean() * 1000, "count": len(values)}
+        return result
+
+    def format_summary(self):
+        lines = []
+        for name, stats in self.summary().items():
+            lines.append(f"  {name:18s} p50 {stats['p50']:7.2f}  p95 {stats['p95']:7.2f}  p99 {stats['p99']:7.2f} ms")
+        return "\n".join(lines)
+
+
+class StatsServer(socketserver.ThreadingTCPServer):
+    """
+    Serves Telemetry.summary() as JSON to anything that connects, e.g. `nc localhost 5055`.
+
+    Only listens on localhost. Runs in a daemon thread once start() is called.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, telemetry, port, extra=None):
+        self.telemetry = telemetry
+        self.extra = extra # optional callable returning more fields for the JSON (e.g. throughput)
+        super().__init__(("127.0.0.1", port), _StatsHandler)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="stats-server", daemon=True).start()
+
+    def snapshot(self):
+        data = {"frames": self.telemetry.frames, "latency_ms": self.telemetry.summary()}
+        if self.extra is not None:
+            data.update(self.extra())
+        return data
+
+
+class _StatsHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.wfile.write((json.dumps(self.server.snapshot(), indent=2) + "\n").encode())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# Records raw camera frames for replaying with: python overlay.py --replay <folder>
+# Pass a ring name as well to record from capture_server.py while the overlay is running:
+#   python tests/record_frames.py recording overlay-cam0
+import os
+import sys
+import cv2
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # for V0.5/ modules
+
+# === CONFIGURATION ===
+SAVE_DIR   = sys.argv[1] if len(sys.argv) > 1 else "recording"
+RING_NAME  = sys.argv[2] if len(sys.argv) > 2 else None
+FRAME_SIZE = (640, 480)   # should match FRAME_SIZE in overlay.py
+MAX_FRAMES = 600          # ~20 s at 30 fps
+# ======================
+
+os.makedirs(SAVE_DIR, exist_ok=True)
+
+if RING_NAME is None:
+    from picamera2 import Picamera2
+    picam2 = Picamera2()
+    picam2.preview_configuration.main.size   = FRAME_SIZE
+    picam2.preview_configuration.main.format = "RGB888"
+    picam2.configure("preview")
+    picam2.start()
+    time.sleep(1)
+else:
+    # Every frame in order, read straight out of the shared ring
+    import sources
+    picam2 = sources.RingSource(RING_NAME, latest=False)
+    picam2.start()
+
+print(f"Recording up to {MAX_FRAMES} frames to '{SAVE_DIR}/'. Press Q or ESC to stop.")
+
+torn = 0 # ring frames the writer overwrote while we were saving them
+try:
+    i = 0
+    while i < MAX_FRAMES:
+        path = os.path.join(SAVE_DIR, f"frame_{i:05d}.png")
+        if RING_NAME is None:
+            frame = picam2.capture_array()
+            # Saved exactly as captured (upside-down) - the overlay does its own flip
+            cv2.imwrite(path, frame)
+        else:
+            ring_frame = picam2.read()
+            frame = ring_frame.image
+            if picam2.flipped:
+                frame = cv2.rotate(frame, cv2.ROTATE_180) # replays expect the raw upside-down frames
+            cv2.imwrite(path, frame)
+            # The image may be the ring slot itself - if it was overwritten meanwhile the file is torn
+            if not ring_frame.intact():
+                os.remove(path)
+                torn += 1
+                continue
+        i += 1
+
+        cv2.imshow("Recording (flipped for preview)", cv2.rotate(frame, cv2.ROTATE_180))
+        if cv2.waitKey(1) & 0xFF in (27, ord('q')):
+            break
+finally:
+    picam2.stop()
+    if RING_NAME is not None:
+        picam2.close() # detach from the shared ring
+    cv2.destroyAllWindows()
+    if torn:
+        print(f"Dropped {torn} frames overwritten in the ring while saving them.")
+    print("Done.")
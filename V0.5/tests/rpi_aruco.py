@@ -1,8 +1,15 @@
+import os
+import sys
 from picamera2 import Picamera2
 import cv2
 import numpy as np
 import time
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # for V0.5/ modules
+import detector
+
+PROFILE = sys.argv[1] if len(sys.argv) > 1 else "balanced" # see detector.PROFILES
+
 # Initialize Picamera2
 picam2 = Picamera2()
 picam2.preview_configuration.main.size = (640, 480)
@@ -13,9 +20,8 @@ picam2.start()
 # Allow camera to warm up
 time.sleep(1)
 
-# Load ArUco dictionary and parameters (legacy API)
-aruco_dict = cv2.aruco.Dictionary_get(cv2.aruco.DICT_6X6_250)
-parameters = cv2.aruco.DetectorParameters_create()
+# ArUco detector with the profile's parameters (ArucoDetector on OpenCV >= 4.7, detectMarkers before)
+marker_detector = detector.MarkerDetector(cv2.aruco.DICT_6X6_250, profile=PROFILE)
 
 print("Press 'q' to quit...")
 
@@ -28,7 +34,7 @@ while True:
     gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
 
     # Detect ArUco markers
-    corners, ids, rejected = cv2.aruco.detectMarkers(gray, aruco_dict, parameters=parameters)
+    corners, ids = marker_detector.detect(gray)
 
     # If markers are found, draw them
     if ids is not None:
@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
+import os
+import sys
 import cv2
-from picamera2 import Picamera2
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # for V0.5/ modules
+import sources
 
 # === CONFIGURATION ===
 FRONT_CAMERA_INDEX    = 0      # CSI port for your wide-angle “front” camera
@@ -9,25 +13,17 @@ OBSERVER_CAMERA_INDEX = 1      # CSI port for your normal “observer” camera
 # Desired resolutions (you can tweak these)
 FRONT_WIDTH, FRONT_HEIGHT   = 1280, 720
 OBS_WIDTH, OBS_HEIGHT       = 1280, 720
+PAIR_TOLERANCE = 0.008         # seconds the two sensor timestamps may differ
 # ======================
 
-# Initialize both Picamera2 instances
-front_cam = Picamera2(camera_num=FRONT_CAMERA_INDEX)
-obs_cam   = Picamera2(camera_num=OBSERVER_CAMERA_INDEX)
-
-# Configure each for video capture
-front_config = front_cam.create_video_configuration(
-    main={"size": (FRONT_WIDTH, FRONT_HEIGHT), "format": "RGB888"}
-)
-obs_config = obs_cam.create_video_configuration(
-    main={"size": (OBS_WIDTH, OBS_HEIGHT), "format": "RGB888"}
-)
-front_cam.configure(front_config)
-obs_cam.configure(obs_config)
+# Both cameras capture at the same time on their own threads, frames come out paired by sensor timestamp.
+# The ISP flips both 180° (upside-down → right-side-up)
+front_cam = sources.PicameraSource((FRONT_WIDTH, FRONT_HEIGHT), format="RGB888", camera_num=FRONT_CAMERA_INDEX, isp_flip_180=True)
+obs_cam   = sources.PicameraSource((OBS_WIDTH, OBS_HEIGHT), format="RGB888", camera_num=OBSERVER_CAMERA_INDEX, isp_flip_180=True)
+cameras   = sources.PairedSource(front_cam, obs_cam, tolerance=PAIR_TOLERANCE)
 
 # Start streaming
-front_cam.start()
-obs_cam.start()
+cameras.start()
 
 # Create resizable OpenCV windows
 cv2.namedWindow("Front Camera",    cv2.WINDOW_NORMAL)
@@ -39,23 +35,19 @@ print("Streaming both cameras. Press Q or ESC to quit.")
 
 try:
     while True:
-        # Grab frames
-        front_frame = front_cam.capture_array("main")
-        obs_frame   = obs_cam.capture_array("main")
-
-        # Flip both 180° (upside-down → right-side-up)
-        front_frame = cv2.rotate(front_frame, cv2.ROTATE_180)
-        obs_frame   = cv2.rotate(obs_frame,   cv2.ROTATE_180)
+        # Grab a matched pair
+        pair = cameras.read()
 
         # Show them
-        cv2.imshow("Front Camera",    front_frame)
-        cv2.imshow("Observer Camera", obs_frame)
+        cv2.imshow("Front Camera",    pair.front.image)
+        cv2.imshow("Observer Camera", pair.observer.image)
+        print(f"\rskew {pair.skew * 1000:+6.2f} ms, unpaired {cameras.unpaired}", end="")
+        pair.release()
 
         # Exit if user presses ESC or 'q'
         if cv2.waitKey(1) & 0xFF in (27, ord('q')):
             break
 
 finally:
-    front_cam.stop()
-    obs_cam.stop()
+    cameras.stop()
     cv2.destroyAllWindows()
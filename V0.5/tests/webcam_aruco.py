@@ -1,6 +1,13 @@
+import os
+import sys
 import cv2
 import time
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # for V0.5/ modules
+import detector
+
+PROFILE = sys.argv[1] if len(sys.argv) > 1 else "balanced" # see detector.PROFILES
+
 def main():
     # 1) Open the default webcam (change 0 if you have multiple cameras)
     cap = cv2.VideoCapture(0)
@@ -8,14 +15,9 @@ def main():
         print("Error: Could not open webcam.")
         return
 
-    # 2) Load the 6×6_250 ArUco dictionary
-    aruco_dict = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_6X6_250)
-
-    # 3) Create detector parameters (use defaults, but you can tweak fields on this object)
-    parameters = cv2.aruco.DetectorParameters()
-
-    # 4) Build the detector
-    detector = cv2.aruco.ArucoDetector(aruco_dict, parameters)
+    # 2) Build the detector for the 6×6_250 dictionary with the profile's parameters
+    #    (ArucoDetector on OpenCV >= 4.7, the legacy detectMarkers before that)
+    marker_detector = detector.MarkerDetector(cv2.aruco.DICT_6X6_250, profile=PROFILE)
     prev_time = time.time()
 
     print("Press 'q' to quit.")
@@ -25,10 +27,10 @@ def main():
             print("Failed to grab frame")
             break
 
-        # 5) Detect markers         (works on color or grayscale internally)
-        corners, ids, rejected = detector.detectMarkers(frame)
+        # 3) Detect markers         (works on color or grayscale internally)
+        corners, ids = marker_detector.detect(frame)
 
-        # 6) If any markers found, draw outlines and IDs
+        # 4) If any markers found, draw outlines and IDs
         if ids is not None:
             cv2.aruco.drawDetectedMarkers(frame, corners, ids, borderColor=(0,255,0))
         
@@ -47,12 +49,12 @@ def main():
             cv2.LINE_AA
         )
 
-        # 7) Show the annotated frame
-        cv2.imshow('Aruco Detection (OpenCV 4.12.0)', frame)
+        # 5) Show the annotated frame
+        cv2.imshow(f'Aruco Detection (OpenCV {cv2.__version__}, {PROFILE})', frame)
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
 
-    # 8) Cleanup
+    # 6) Cleanup
     cap.release()
     cv2.destroyAllWindows()
 
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+import multiprocessing
+import queue
+import threading
+import numpy as np
+from multiprocessing import shared_memory
+import telemetry
+
+# Multi-process marker detection for overlay.py.
+# Python threads only get one core for detection (the GIL is released inside OpenCV, but
+# everything around it queues up behind it), so DetectionPool runs N detector processes.
+# Frames go to them through a block of shared memory split into fixed slots - only the slot
+# number and a sequence number are sent over a queue, the pixels are never pickled.
+# Workers finish out of order, so results come back through a Sequencer.
+# Workers are started through a forkserver rather than forked from overlay.py itself: by
+# then Picamera2/libcamera already run threads, and forking a multi-threaded process can
+# leave a lock held forever in the child.
+
+
+class Sequencer:
+    """
+    Puts results that arrive out of order back in sequence-number order.
+
+    Args:
+        start (int): The first sequence number that will be pushed.
+    """
+
+    def __init__(self, start=0):
+        self.next = start
+        self.waiting = {}
+
+    def push(self, seq, item):
+        """Adds one result and returns the list of results that are now in order (often empty)."""
+        self.waiting[seq] = item
+        ready = []
+        while self.next in self.waiting:
+            ready.append(self.waiting.pop(self.next))
+            self.next += 1
+        return ready
+
+    def __len__(self):
+        return len(self.waiting)
+
+
+def _detect_worker(shm_name, shape, tasks, results, ready, make_detector, make_pose_engine, configure):
+    # Runs in each worker process: detect + estimate pose for every slot it is handed
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        frames = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        try:
+            marker_detector = make_detector()
+            pose_engine = make_pose_engine()
+            marker_detector.detect(np.zeros(shape[1:], dtype=np.uint8)) # the first call sets OpenCV up
+        except Exception as e:
+            ready.put(e)
+            return
+        ready.put(None) # tells DetectionPool.start() this one can take frames
+        current = None
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            seq, slot, settings = task
+            try:
+                if settings is not None and settings != current:
+                    configure(marker_detector, settings)
+                    current = settings
+                corners, ids = marker_detector.detect(frames[slot])
+                detected = telemetry.now()
+                keys, positions = pose_engine.estimate(corners, ids)
+                marks = {"detected": detected, "posed": telemetry.now()}
+                results.put((seq, slot, (keys, positions, marks)))
+            except Exception as e:
+                results.put((seq, slot, e))
+    finally:
+        shm.close()
+
+
+class DetectionPool:
+    """
+    N detector processes fed through shared-memory frame slots.
+
+    Usage (one thread submits, one collects - they can be the same):
+        slot = pool.acquire()              # None if every slot is busy -> skip the frame
+        preprocess(frame, out=pool.frames[slot])
+        pool.submit(slot, timing)          # timing (any object) comes back with the result
+        for timing, keys, positions, marks in pool.results(timeout=0.1): ...
+
+    Args:
+        workers (int): Number of processes - up to one per spare core.
+        size (tuple): (width, height) of the gray frames.
+        make_detector (callable): Builds the detector inside each worker. Has to be picklable
+            (a module-level function or a functools.partial). Each worker only sees every
+            Nth frame, so it shouldn't rely on tracking between frames.
+        make_pose_engine (callable): Builds the worker's poses.PoseEngine, same rules.
+        configure (callable): configure(detector, settings) applies the settings given to
+            submit() to a worker's detector, same rules. Only called when they change.
+        slots (int): Frames that can be in flight at once. Default two per worker, so each
+            worker has the next frame waiting while it works on one.
+        start_method (str): multiprocessing start method for the workers. With "forkserver"
+            or "spawn" the worker functions are pickled, and a script that creates the pool
+            needs an if __name__ == "__main__" guard.
+    """
+
+    def __init__(self, workers, size, make_detector, make_pose_engine, configure=None, slots=None, start_method="forkserver"):
+        width, height = size
+        slots = slots if slots is not None else 2 * workers
+        self.shape = (slots, height, width)
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * height * width)
+        self.frames = np.ndarray(self.shape, dtype=np.uint8, buffer=self.shm.buf)
+
+        self._free = list(range(slots)) # shared by the submitting and the collecting thread
+        self._free_lock = threading.Lock()
+        context = multiprocessing.get_context(start_method)
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._ready = context.Queue()
+        self._context = {} # seq -> whatever was passed to submit()
+        self._sequencer = Sequencer()
+        self._next_seq = 0
+        self.skipped = 0 # frames that found no free slot
+
+        self.processes = [
+            context.Process(target=_detect_worker, name=f"detect-{i}", daemon=True,
+                                    args=(self.shm.name, self.shape, self._tasks, self._results, self._ready,
+                                          make_detector, make_pose_engine, configure))
+            for i in range(workers)
+        ]
+
+    def start(self, timeout=30.0):
+        """
+        Starts the workers and waits until every one has its detector and pose engine built,
+        so the first frames don't queue up behind their start-up (and count as slow).
+        If a worker fails or doesn't get there within timeout seconds, the pool is closed
+        and the error raised.
+        """
+        for process in self.processes:
+            process.start()
+        try:
+            for _ in self.processes:
+                try:
+                    outcome = self._ready.get(timeout=timeout)
+                except queue.Empty:
+                    raise RuntimeError(f"OverlayPT: Detection workers not ready after {timeout:g} s") from None
+                if isinstance(outcome, Exception):
+                    raise outcome
+        except BaseException:
+            self.close()
+            raise
+
+    def acquire(self):
+        """A free slot number, or None if all of them are in flight."""
+        with self._free_lock:
+            if not self._free:
+                self.skipped += 1
+                return None
+            return self._free.pop()
+
+    def release(self, slot):
+        """Gives back a slot from acquire() that won't be submitted after all."""
+        with self._free_lock:
+            self._free.append(slot)
+
+    def submit(self, slot, context=None, settings=None):
+        """
+        Hands a filled slot to the workers. Returns its sequence number.
+
+        settings (picklable, comparable with ==, e.g. a tuple) go to configure() in whichever
+        worker takes the frame, before it detects - None leaves its detector as it is.
+        """
+        seq = self._next_seq
+        self._next_seq += 1
+        self._context[seq] = context
+        self._tasks.put((seq, slot, settings))
+        return seq
+
+    @property
+    def pending(self):
+        """Frames submitted but not yet returned by results()."""
+        return len(self._context)
+
+    def results(self, timeout=None):
+        """
+        Waits up to timeout for the next finished frame.
+
+        Returns:
+            list: (context, keys, positions, marks) for every frame that is now complete in
+            submission order - empty if nothing came in, more than one if a late frame
+            was holding others back. Raises a worker's exception if it failed.
+        """
+        try:
+            seq, slot, outcome = self._results.get(timeout=timeout)
+        except queue.Empty:
+            return []
+        with self._free_lock:
+            self._free.append(slot)
+        if isinstance(outcome, Exception):
+            raise outcome
+        ready = []
+        for seq, (keys, positions, marks) in self._sequencer.push(seq, (seq, outcome)):
+            ready.append((self._context.pop(seq), keys, positions, marks))
+        return ready
+
+    def close(self):
+        for _ in self.processes:
+            self._tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        self.frames = None
+        self.shm.close()
+        self.shm.unlink()